@@ -0,0 +1,158 @@
+"""Headless batch mode: run a JSONL question bank through the agent without Streamlit.
+
+Each input line is a JSON object with a `prompt` and optionally an `id`, `thread_id` and
+`parent_message_id`. Runs go through the same `DataAgentRunRequest` construction as the app,
+at most `--concurrency` at a time, and one JSON result per prompt is appended to the output
+file as soon as that run completes (so output order is completion order, keyed by `id`).
+A line that is not a JSON object with a `prompt` gets an error result; the others still run.
+
+    python batch_runner.py questions.jsonl -o results.jsonl -c 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from models import Message, MessageContentItem, TextContentItem
+from models.async_agent_client import AsyncAgentClient
+from models.run_request import build_run_request
+
+
+def read_prompts(path):
+    """Yield (line_number, line) for every non-empty line of a JSONL file; lines are parsed per run"""
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if line:
+                yield line_number, line
+
+
+def parse_record(line):
+    """The JSON object on an input line; ValueError if the line is not one"""
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+    return record
+
+
+def record_id(record, line_number):
+    """The input's id, or its line number when it has none, so results join back to their inputs"""
+    return record.get("id", f"line-{line_number}")
+
+
+async def run_prompt(client, record, line_number):
+    """Run one prompt to completion and return its result record"""
+    message = Message(
+        role="user",
+        content=[MessageContentItem(TextContentItem(type="text", text=record["prompt"]))],
+    )
+    request = build_run_request(
+        [message],
+        thread_id=record.get("thread_id"),
+        parent_message_id=record.get("parent_message_id"),
+    )
+
+    result = {
+        "id": record_id(record, line_number),
+        "prompt": record["prompt"],
+        "thread_id": record.get("thread_id"),
+        "status": "ok",
+        "message": None,
+        "text": "",
+        "tables": [],
+        "message_ids": {},
+        "events": 0,
+        "timings": {},
+    }
+    started = time.perf_counter()
+    timings = result["timings"]
+    async for event, data in client.events(request):
+        elapsed = round(time.perf_counter() - started, 4)
+        timings.setdefault("first_event_s", elapsed)
+        result["events"] += 1
+        match event:
+            case "response.text.delta":
+                timings.setdefault("first_text_s", elapsed)
+            case "response.table":
+                table = json.loads(data)
+                result_set = table.get("result_set") or {}
+                result["tables"].append({
+                    "title": table.get("title"),
+                    "query_id": table.get("query_id"),
+                    "columns": [col["name"] for col in result_set.get("resultSetMetaData", {}).get("rowType", [])],
+                    "data": result_set.get("data", []),
+                })
+            case "metadata":
+                metadata = json.loads(data).get("metadata", {})
+                if "message_id" in metadata:
+                    result["message_ids"][metadata.get("role")] = int(metadata["message_id"])
+            case "error":
+                result["status"] = "error"
+                result["error"] = json.loads(data)
+            case "response":
+                final = Message.from_json(data)
+                result["message"] = final.to_dict()
+                result["text"] = "".join(
+                    item.actual_instance.text
+                    for item in final.content
+                    if item.actual_instance.type == "text"
+                )
+    timings["total_s"] = round(time.perf_counter() - started, 4)
+    if result["status"] == "ok" and result["message"] is None:
+        result["status"] = "error"
+        result["error"] = {"message": "Stream ended without a response event"}
+    return result
+
+
+async def run_batch(input_path, output_path, concurrency, client):
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"ok": 0, "error": 0}
+
+    with open(output_path, "a") as out:
+        def write(result):
+            counts[result["status"]] += 1
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+
+        async def worker(line_number, line):
+            async with semaphore:
+                # A bad line fails only its own result; the rest of the batch still runs
+                record = {}
+                try:
+                    record = parse_record(line)
+                    if "prompt" not in record:
+                        raise ValueError("missing 'prompt'")
+                    result = await run_prompt(client, record, line_number)
+                except Exception as e:
+                    result = {
+                        "id": record_id(record, line_number),
+                        "prompt": record.get("prompt"),
+                        "status": "error",
+                        "error": {"message": str(e)},
+                    }
+            write(result)
+            print(f"[{result['status']}] {result['id']} ({result.get('timings', {}).get('total_s', '-')}s)")
+
+        started = time.perf_counter()
+        async with client:
+            await asyncio.gather(*(worker(n, line) for n, line in read_prompts(input_path)))
+    print(f"Finished {counts['ok']} ok / {counts['error']} failed in {time.perf_counter() - started:.1f}s -> {output_path}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL question bank against a Cortex Agent")
+    parser.add_argument("input", nargs="?", default="requests.jsonl", help="JSONL file of prompts")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Maximum runs in flight")
+    parser.add_argument("--agent", help="Agent name (defaults to CORTEX_AGENT_DEMO_AGENT)")
+    args = parser.parse_args(argv)
+
+    client = AsyncAgentClient(agent=args.agent, max_connections=args.concurrency)
+    counts = asyncio.run(run_batch(args.input, args.output, args.concurrency, client))
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
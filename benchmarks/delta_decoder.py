@@ -0,0 +1,40 @@
+"""Per-event cost of decoding text and thinking deltas: pydantic models against `models/delta_decoder.py`.
+
+    python -m benchmarks.delta_decoder --number 200000
+"""
+import argparse
+import json
+import timeit
+
+from models import TextDeltaEventData, ThinkingDeltaEventData
+from models.delta_decoder import decode_text_delta, decode_thinking_delta
+from models.sse_parser import Event
+
+TEXT_DELTA = json.dumps({"content_index": 5, "text": " revenue"})
+THINKING_DELTA = json.dumps({"content_index": 0, "text": " Looking at the sales table"})
+TEXT_DELTA_RAW = TEXT_DELTA.encode()
+THINKING_DELTA_RAW = THINKING_DELTA.encode()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000, help="Events decoded per timing")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    cases = {
+        "text / pydantic": lambda: TextDeltaEventData.from_json(TEXT_DELTA),
+        # A fresh event each time, so the JSON parse is timed too
+        "text / fast": lambda: decode_text_delta(Event("response.text.delta", raw=TEXT_DELTA_RAW), strict=False),
+        "thinking / pydantic": lambda: ThinkingDeltaEventData.from_json(THINKING_DELTA),
+        "thinking / fast": lambda: decode_thinking_delta(Event("response.thinking.delta", raw=THINKING_DELTA_RAW), strict=False),
+        "json.loads only": lambda: json.loads(TEXT_DELTA),
+    }
+    print(f"{'decoder':<20} {'us/event':>9} {'events/s':>12}")
+    for name, decode in cases.items():
+        seconds = min(timeit.repeat(decode, number=args.number, repeat=args.repeat)) / args.number
+        print(f"{name:<20} {seconds * 1e6:>9.3f} {1 / seconds:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Cost of handling the final `response` event, before and after `models/final_response.py`.
+
+Builds a final response with several tables (the mock run's tool result, table and chart
+repeated `--tables` times) and times the previous handling (Message.from_json, two passes
+filtering thinking, two Message copies, to_json, then the db layer loading both JSON strings
+again) against `process_final_response` on the once-decoded data.
+
+    python -m benchmarks.final_response --tables 1 5 20 --table-rows 2000
+"""
+import argparse
+import json
+import random
+import timeit
+
+import mock_cortex_server
+from models import Message, json_codec
+from models.final_response import process_final_response
+
+
+def multi_table_response(tables, table_rows, seed=0):
+    config = mock_cortex_server.parse_args(["--table-rows", str(table_rows), "--seed", str(seed)])
+    response = dict(mock_cortex_server.build_run(config, random.Random(seed), None, None))["response"]
+    repeated = [item for item in response["content"] if item["type"] in ("tool_result", "table", "chart")]
+    content = [item for item in response["content"] if item["type"] not in ("tool_result", "table", "chart")]
+    # Keep thinking, tool use and text where they were; one tool result, table and chart per query
+    position = next(i for i, item in enumerate(content) if item["type"] == "tool_use") + 1
+    content[position:position] = repeated * tables
+    return {**response, "content": content}
+
+
+def previous(raw):
+    """The `case "response"` branch as it was, plus what save_thread_info did with its output"""
+    data = Message.from_json(raw)
+    clean_content = []
+    for content_item in data.content:
+        if hasattr(content_item.actual_instance, 'type'):
+            if content_item.actual_instance.type != 'thinking':
+                clean_content.append(content_item)
+    display = Message(role=data.role, content=clean_content)
+    clean_content = []
+    summary = ''
+    for content_item in data.content:
+        if hasattr(content_item.actual_instance, 'type'):
+            if content_item.actual_instance.type != 'thinking':
+                clean_content.append(content_item)
+                if hasattr(content_item.actual_instance, 'text'):
+                    summary += content_item.actual_instance.text
+    message_json = Message(role=data.role, content=clean_content).to_json()
+    json_codec.loads(raw)
+    json.loads(message_json)
+    json.loads(raw)
+    return display, summary
+
+
+def single_pass(raw):
+    final = process_final_response(json_codec.loads(raw))
+    return final.message, final.summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--table-rows", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"JSON backend: {json_codec.BACKEND}")
+    print(f"{'tables':>6} {'bytes':>12} {'previous ms':>12} {'single ms':>10} {'speedup':>8}")
+    for tables in args.tables:
+        raw = json_codec.dumps(multi_table_response(tables, args.table_rows))
+        old_message, old_summary = previous(raw)
+        new_message, new_summary = single_pass(raw)
+        assert new_message.to_dict() == old_message.to_dict() and new_summary == old_summary
+        timings = [
+            min(timeit.repeat(lambda: run(raw), number=args.number, repeat=3)) / args.number
+            for run in (previous, single_pass)
+        ]
+        print(f"{tables:>6} {len(raw):>12,} {timings[0] * 1000:>12.1f} {timings[1] * 1000:>10.1f} {timings[0] / timings[1]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
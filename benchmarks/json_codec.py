@@ -0,0 +1,59 @@
+"""Decode and encode cost of the JSON backends in `models/json_codec.py` on large events.
+
+Times raw loads/dumps of a `response.table` event and a final `response` event, and
+`Message.from_json`/`to_json` (which also pay for the oneOf wrappers) with each backend
+that is installed.
+
+    python -m benchmarks.json_codec --table-rows 2000
+"""
+import argparse
+import random
+import timeit
+
+import mock_cortex_server
+from models import Message, json_codec
+
+
+def sample_events(table_rows, seed=0):
+    config = mock_cortex_server.parse_args(["--table-rows", str(table_rows), "--seed", str(seed)])
+    events = dict(mock_cortex_server.build_run(config, random.Random(seed), None, None))
+    return events["response.table"], events["response"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table-rows", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    table, response = sample_events(args.table_rows)
+    table_json = json_codec.dumps(table)
+    response_json = json_codec.dumps(response)
+    message = Message.from_json(response_json)
+    print(f"response.table {len(table_json):,} bytes, response {len(response_json):,} bytes")
+    print(f"{'backend':<8} {'case':<22} {'ms':>9}")
+
+    active = json_codec.BACKEND, json_codec.loads, json_codec.dumpb
+    try:
+        for name in ("stdlib", "orjson", "msgspec"):
+            backend = json_codec.select_backend(name)
+            if backend[0] != name:
+                print(f"{name:<8} not installed")
+                continue
+            # Models look the codec functions up at call time, so swapping them here is enough
+            json_codec.BACKEND, json_codec.loads, json_codec.dumpb = backend
+            cases = {
+                "loads table": lambda: json_codec.loads(table_json),
+                "dumps table": lambda: json_codec.dumps(table),
+                "Message.from_json": lambda: Message.from_json(response_json),
+                "Message.to_json": lambda: message.to_json(),
+            }
+            for case, run in cases.items():
+                seconds = min(timeit.repeat(run, number=args.number, repeat=3)) / args.number
+                print(f"{name:<8} {case:<22} {seconds * 1000:>9.3f}")
+    finally:
+        json_codec.BACKEND, json_codec.loads, json_codec.dumpb = active
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Payload size and serialization cost of stateless :run bodies against history length.
+
+Compares `DataAgentRunRequest.to_json()` with the streamed writer in `models/request_body.py`,
+plain and gzipped. Histories are built from the mock server's assistant responses, so every
+turn carries a table and a chart like a real analyst answer. The requests hold the full
+history: `build_run_request` would trim it to the history budget (`models/history_planner.py`).
+
+    python -m benchmarks.request_body --turns 1 5 10 25 50 --table-rows 200
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import mock_cortex_server
+from models import DataAgentRunRequest, Message, MessageContentItem, TextContentItem
+from models.request_body import RequestBody
+
+
+def build_history(turns, table_rows, seed=0):
+    config = mock_cortex_server.parse_args(["--table-rows", str(table_rows), "--seed", str(seed)])
+    rng = random.Random(seed)
+    messages = []
+    for turn in range(turns):
+        messages.append(Message(
+            role="user",
+            content=[MessageContentItem(TextContentItem(type="text", text=f"Question {turn}: revenue by region?"))],
+        ))
+        events = mock_cortex_server.build_run(config, rng, None, None)
+        messages.append(Message.from_dict(events[-1][1]))
+    messages.append(Message(
+        role="user",
+        content=[MessageContentItem(TextContentItem(type="text", text="And by product?"))],
+    ))
+    return messages
+
+
+def measure(serialize, repeat):
+    """Best-of-`repeat` seconds, bytes produced, and peak traced memory of one run"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = serialize()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    serialize()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, size, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--table-rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'turns':>5} {'mode':<10} {'bytes':>11} {'ms':>9} {'peak KiB':>10}")
+    for turns in args.turns:
+        request = DataAgentRunRequest(model="claude-4-sonnet", messages=build_history(turns, args.table_rows))
+        plain = RequestBody(request, compression="none")
+        gzipped = RequestBody(request, compression="gzip")
+        modes = {
+            "to_json": lambda: len(request.to_json().encode()),
+            "streamed": lambda: sum(len(chunk) for chunk in plain),
+            "gzip": lambda: sum(len(chunk) for chunk in gzipped),
+        }
+        for mode, serialize in modes.items():
+            seconds, size, peak = measure(serialize, args.repeat)
+            print(f"{turns:>5} {mode:<10} {size:>11,} {seconds * 1000:>9.2f} {peak / 1024:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Throughput of `models/sse_parser.py` against sseclient on a recorded event stream.
+
+The stream is either a raw SSE capture (e.g. `curl -N ... > run.sse`) or a run generated
+by the mock server. It is cut into fixed-size chunks, as the socket would deliver it, and
+parsed by both implementations.
+
+    python -m benchmarks.sse_parser --text-tokens 5000 --chunk-sizes 64 1024 16384
+    python -m benchmarks.sse_parser --file run.sse
+"""
+import argparse
+import json
+import random
+import time
+
+import mock_cortex_server
+from models.sse_parser import iter_events
+
+try:
+    import sseclient
+except ImportError:  # Optional: only needed for the comparison
+    sseclient = None
+
+
+def generated_stream(text_tokens, seed=0):
+    config = mock_cortex_server.parse_args(["--text-tokens", str(text_tokens), "--seed", str(seed)])
+    events = mock_cortex_server.build_run(config, random.Random(seed), None, None)
+    return b"".join(
+        f"id: {index}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+        for index, (event, data) in enumerate(events)
+    )
+
+
+def parse_builtin(chunks):
+    count = 0
+    for _ in iter_events(chunks):
+        count += 1
+    return count
+
+
+def parse_sseclient(chunks):
+    count = 0
+    for _ in sseclient.SSEClient(iter(chunks)).events():
+        count += 1
+    return count
+
+
+def best_of(parse, chunks, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = parse(chunks)
+        best = min(best, time.perf_counter() - started)
+    return best, count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", help="Raw SSE capture to parse instead of a generated run")
+    parser.add_argument("--text-tokens", type=int, default=5000)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[64, 1024, 16384])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            stream = f.read()
+    else:
+        stream = generated_stream(args.text_tokens)
+    parsers = {"builtin": parse_builtin}
+    if sseclient is not None:
+        parsers["sseclient"] = parse_sseclient
+    else:
+        print("sseclient-py is not installed; timing the built-in parser only")
+
+    print(f"{len(stream):,} bytes")
+    print(f"{'chunk':>6} {'parser':<10} {'events':>7} {'ms':>9} {'MB/s':>8} {'us/event':>9}")
+    for chunk_size in args.chunk_sizes:
+        chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+        for name, parse in parsers.items():
+            seconds, count = best_of(parse, chunks, args.repeat)
+            print(f"{chunk_size:>6} {name:<10} {count:>7} {seconds * 1000:>9.2f} "
+                  f"{len(stream) / seconds / 1e6:>8.1f} {seconds / count * 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
+import contextlib
+import functools
 import json
 import os
+import time
 from collections import defaultdict
+from typing import Callable
 
-import numpy as np
 import pandas as pd
 import requests
-import sseclient
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -13,54 +15,87 @@ from dotenv import load_dotenv
 load_dotenv('env.dev')
 
 from models import (
+    AnalystToolResultDeltaEventData,
     ChartEventData,
-    DataAgentRunRequest,
     ErrorEventData,
     Message,
     MessageContentItem,
     StatusEventData,
     TableEventData,
     TextContentItem,
-    TextDeltaEventData,
-    ThinkingDeltaEventData,
     ThinkingEventData,
-    ToolResultEventData,
-    ToolUseEventData,
+    json_codec,
 )
 
 # Import thread manager
-from models.thread_manager import clear_chat_session
+from models.thread_manager import apply_pending_thread_name, clear_chat_session, thread_pool
 from models.db_manager import save_thread_info, load_conversation_context, get_user_threads
+from models import metrics
+from models.admission import ADMISSION_TIMEOUT, AdmissionTimeout, admission, session_user
+from models.deadlines import RunDeadlineExceeded
+from models.analyst_view import AnalystView
+from models.delta_buffer import StreamingText
+from models.delta_decoder import decode_text_delta, decode_thinking_delta
+from models.event_queue import EVENT_QUEUE_SIZE, QueuedEventStream
+from models.event_recorder import EventRecorder
+from models.fan_out import FANOUT_AGENTS, MultiplexedEventStream, open_concurrently
+from models.final_response import process_final_response
+from models.render_scheduler import STRUCTURAL_EVENTS, RenderScheduler
+from models.http_client import (
+    CortexRequestError,
+    CortexThrottledError,
+    connection_stats,
+    cortex_request,
+    parse_retry_after,
+)
+from models.replay import REPLAY_PATH, ReplayStream
+from models.resumable_stream import ResumableEventStream
+from models.run_telemetry import RunTelemetry
+from models.sse_parser import Event
+from models import single_flight
+from models.request_body import RequestBody, iter_json
+from models.run_request import build_run_request
 
 PAT = os.getenv("CORTEX_AGENT_DEMO_PAT")
 HOST = os.getenv("CORTEX_AGENT_DEMO_HOST")
+# "http" lets the app talk to mock_cortex_server.py
+SCHEME = os.getenv("CORTEX_AGENT_DEMO_SCHEME", "https")
 DATABASE = os.getenv("CORTEX_AGENT_DEMO_DATABASE", "SNOWFLAKE_INTELLIGENCE")
 SCHEMA = os.getenv("CORTEX_AGENT_DEMO_SCHEMA", "AGENTS")
 AGENT = os.getenv("CORTEX_AGENT_DEMO_AGENT", "SALES_INTELLIGENCE_AGENT")
 
-def agent_run() -> requests.Response:
-    """Calls the REST API and returns a streaming client."""
-    # Check if we have an active thread for thread-based conversation
-    if hasattr(st.session_state, 'current_thread_id') and st.session_state.current_thread_id:
-        # Thread-based conversation - only send current message (server maintains context with correct parent_message_id)
-        request_body = DataAgentRunRequest(
-            thread_id=st.session_state.current_thread_id,
-            parent_message_id=st.session_state.parent_message_id,
-            messages=[st.session_state.messages[-1]],  # Only the latest message
-        )
-    else:
-        # Original behavior - send all messages
-        request_body = DataAgentRunRequest(
-            model="claude-4-sonnet",
-            messages=st.session_state.messages,
-        )
+def agent_run(agent: str = AGENT) -> ResumableEventStream | single_flight.SharedRunSubscriber | ReplayStream:
+    """Calls the REST API and returns a streaming client that reconnects on dropped connections."""
+    return prepare_agent_run(agent)()
+
+
+def prepare_agent_run(agent: str = AGENT, use_thread: bool = True) -> Callable[[], ResumableEventStream | single_flight.SharedRunSubscriber | ReplayStream]:
+    """Builds the run request from the session and returns the function that sends it.
+
+    Only this part reads st.session_state, so the returned function can be called from any
+    thread (e.g. to start several agents at once). `use_thread=False` sends the full history
+    without thread context.
+    """
+    if REPLAY_PATH:
+        # Profiling: play a recorded run through the same rendering path instead of calling the agent
+        return lambda: ReplayStream(REPLAY_PATH)
+
+    # Thread-based conversation sends only the current message (server maintains context with
+    # correct parent_message_id); otherwise the full history is sent
+    request_body = build_run_request(
+        st.session_state.messages,
+        thread_id=getattr(st.session_state, 'current_thread_id', None) if use_thread else None,
+        parent_message_id=getattr(st.session_state, 'parent_message_id', None) if use_thread else None,
+    )
     
     # Debug: Print the constructed URL
-    url = f"https://{HOST}/api/v2/databases/{DATABASE}/schemas/{SCHEMA}/agents/{AGENT}:run"
+    url = f"{SCHEME}://{HOST}/api/v2/databases/{DATABASE}/schemas/{SCHEMA}/agents/{agent}:run"
+    # Admission queues per browser session, so one tab's runs cannot starve another's
+    user = session_user()
 
-    # Debug: Print the payload being sent
-    payload_json = request_body.to_json()
-    print(f"DEBUG - Sending payload: {payload_json}")
+    # Streamed (and optionally gzipped) when posted, so long histories are never one big string
+    body = RequestBody(request_body)
+    print(f"DEBUG - Sending payload: {len(request_body.messages)} message(s), compression={body.compression}")
 
     # Log all payloads to file for comparison analysis
     import datetime
@@ -68,6 +103,8 @@ def agent_run() -> requests.Response:
     thread_info = f"thread_{st.session_state.current_thread_id}" if hasattr(st.session_state, 'current_thread_id') and st.session_state.current_thread_id else "no_thread"
     log_filename = f"payload_log_{thread_info}_{timestamp}.txt"
 
+    # Stateless runs are keyed by a hash of the body, taken in the same serialization pass as the log
+    key = None
     try:
         with open(log_filename, 'w') as f:
             f.write(f"=== PAYLOAD LOG ===\n")
@@ -78,7 +115,11 @@ def agent_run() -> requests.Response:
             f.write(f"Using Thread Context: {hasattr(st.session_state, 'current_thread_id') and st.session_state.current_thread_id is not None}\n")
             f.write(f"URL: {url}\n")
             f.write(f"\n=== PAYLOAD JSON ===\n")
-            f.write(payload_json)
+            if request_body.thread_id:
+                for chunk in iter_json(request_body):
+                    f.write(chunk.decode())
+            else:
+                key = single_flight.request_key(url, request_body, tee=lambda chunk: f.write(chunk.decode()))
             f.write(f"\n\n=== SESSION MESSAGES SUMMARY ===\n")
             for i, msg in enumerate(st.session_state.messages):
                 f.write(f"Message {i}: {msg.role} - {msg.content[0].actual_instance.text[:100] if msg.content else 'No content'}...\n")
@@ -87,28 +128,148 @@ def agent_run() -> requests.Response:
     except Exception as e:
         print(f"Failed to log payload: {e}")
 
-    resp = requests.post(
-        url=url,
-        data=payload_json,
-        headers={
+    def connect(last_event_id=None) -> requests.Response:
+        headers = {
             "Authorization": f'Bearer {PAT}',
             "Content-Type": "application/json",
-        },
-        stream=True,
-        verify=False,
-    )
-    if resp.status_code < 400:
-        return resp  # type: ignore
-    else:
-        raise Exception(f"Failed request with status {resp.status_code}: {resp.text}")
-
-
-def stream_events(response: requests.Response):
-    content = st.container()
-    # Content index to container section mapping
-    content_map = defaultdict(content.empty)
-    # Content index to text buffer
-    buffers = defaultdict(str)
+            **body.headers,
+        }
+        if last_event_id:
+            headers["Last-Event-ID"] = last_event_id
+        resp = cortex_request(
+            "POST",
+            url=url,
+            user=user,
+            admission_timeout=ADMISSION_TIMEOUT,
+            data=body,
+            headers=headers,
+            stream=True,
+            verify=False,
+        )
+        if resp.status_code < 400:
+            return resp  # type: ignore
+        elif resp.status_code == 429:
+            raise CortexThrottledError(resp.status_code, resp.text, parse_retry_after(resp.headers.get("Retry-After")))
+        else:
+            raise CortexRequestError(resp.status_code, resp.text)
+
+    # Reconnects re-post this same payload, so a restart begins from the original parent_message_id
+    if request_body.thread_id:
+        return lambda: ResumableEventStream(connect)
+    # Stateless runs with a byte-identical body (other tabs, dashboards) share one upstream run
+    if key is None:
+        # The payload log failed before the body was hashed
+        key = single_flight.request_key(url, request_body)
+    return lambda: single_flight.subscribe(key, lambda: ResumableEventStream(connect))
+
+
+def events_within_deadlines(stream):
+    """Yield the stream's events, turning a missed first-event or idle deadline into an `error` event"""
+    try:
+        yield from stream
+    except RunDeadlineExceeded as e:
+        yield Event(event="error", data=json.dumps({"code": e.code, "message": str(e)}))
+
+
+def stream_delta(text: StreamingText, data, restart_rendered, renderer: RenderScheduler):
+    """Append a delta and schedule a render, unless it replays text still on screen from before a restart"""
+    offset = len(text)
+    text.append(data.text)
+    rendered = restart_rendered.get(data.content_index)
+    if rendered is not None:
+        if rendered.startswith(data.text, offset):
+            return
+        # The restarted run diverged: redraw this content from the new text
+        del restart_rendered[data.content_index]
+    renderer.update(text)
+
+
+class RunPane:
+    """Where one run is drawn: a section per content index and the streamed content in them"""
+
+    def __init__(self, container):
+        # Content index to container section mapping
+        self.content_map = defaultdict(container.empty)
+        # Content index to streamed text or thinking, redrawn at most RENDER_FPS times a second
+        self.texts = {}
+        # Cortex Analyst results shown part by part, by tool_use_id
+        self.analyst_views = {}
+        # Text already on screen per content index when the run restarted, so replayed deltas are not redrawn
+        self.restart_rendered = {}
+
+
+def render_event(event, pane: RunPane, renderer: RenderScheduler, telemetry: RunTelemetry) -> bool:
+    """Draw an event that adds to the run's content into its pane; False for the events it leaves to the caller"""
+    match event.event:
+        case "stream.restart":
+            # Connection dropped and the run started over: keep the rendered text until the new deltas diverge from it
+            pane.restart_rendered = {index: text.restart() for index, text in pane.texts.items()}
+            # Analyst deltas are replayed too; start them over (the next render replaces the old view)
+            pane.analyst_views.clear()
+        case "response.text.delta":
+            data = decode_text_delta(event)
+            if data.content_index not in pane.texts:
+                pane.texts[data.content_index] = StreamingText(pane.content_map[data.content_index])
+            stream_delta(pane.texts[data.content_index], data, pane.restart_rendered, renderer)
+        case "response.thinking.delta":
+            data = decode_thinking_delta(event)
+            if data.content_index not in pane.texts:
+                pane.texts[data.content_index] = StreamingText(
+                    pane.content_map[data.content_index],
+                    container=lambda placeholder: placeholder.expander("Thinking", expanded=True),
+                )
+            stream_delta(pane.texts[data.content_index], data, pane.restart_rendered, renderer)
+        case "response.thinking":
+            # Thinking done, close the expander
+            data = event.decode(ThinkingEventData)
+            pane.content_map[data.content_index].expander("Thinking").write(data.text)
+        case "response.tool_use":
+            # Shown as received: read the fields needed, no model round trip
+            data = event.json()
+            telemetry.tool_use(data["tool_use_id"], data.get("name"), at=event.received_at)
+            pane.content_map[data["content_index"]].expander("Tool use").json(event.data)
+        case "response.tool_result":
+            data = event.json()
+            telemetry.tool_result(data["tool_use_id"], data.get("status"), at=event.received_at)
+            # An Analyst result streamed as deltas is already on screen in full; keep its view there
+            if data["tool_use_id"] not in pane.analyst_views:
+                pane.content_map[data["content_index"]].expander("Tool result").json(event.data)
+        case "response.chart":
+            data = event.decode(ChartEventData)
+            spec = json_codec.loads(data.chart_spec)
+            pane.content_map[data.content_index].vega_lite_chart(
+                spec,
+                use_container_width=True,
+            )
+        case "response.tool_result.analyst.delta":
+            data = event.decode(AnalystToolResultDeltaEventData)
+            if data.tool_use_id not in pane.analyst_views:
+                pane.analyst_views[data.tool_use_id] = AnalystView(data.tool_use_id, pane.content_map[data.content_index])
+            pane.analyst_views[data.tool_use_id].merge(data.delta)
+            renderer.update(pane.analyst_views[data.tool_use_id])
+            if data.delta.result_set is not None:
+                # Results are what the user is waiting for; don't hold them for the next frame
+                renderer.flush()
+        case "response.table":
+            data = event.decode(TableEventData)
+            column_names = [
+                col.name for col in data.result_set.result_set_meta_data.row_type
+            ]
+            # Built from the rows as given, so a query that returned no rows still shows its columns
+            pane.content_map[data.content_index].dataframe(
+                pd.DataFrame(data.result_set.data, columns=column_names)
+            )
+        case _:
+            return False
+    return True
+
+
+def stream_events(stream: ResumableEventStream | single_flight.SharedRunSubscriber | ReplayStream, telemetry: RunTelemetry | None = None):
+    pane = RunPane(st.container())
+    renderer = RenderScheduler()
+    user_message_saved = False
+    # A replayed run does not belong to the current thread: its message ids are not tracked and nothing is saved
+    persist = not isinstance(stream, ReplayStream)
     spinner = st.spinner("Waiting for response...")
     spinner.__enter__()
 
@@ -116,206 +277,234 @@ def stream_events(response: requests.Response):
     import datetime
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     thread_info = f"thread_{st.session_state.current_thread_id}" if hasattr(st.session_state, 'current_thread_id') and st.session_state.current_thread_id else "no_thread"
-    response_log_filename = f"response_log_{thread_info}_{timestamp}.txt"
-
-    # Initialize response log
-    response_events = []
-
-    events = sseclient.SSEClient(response).events()
-
-    for event in events:
-        # Log raw event for comparison
-        response_events.append(f"EVENT: {event.event}\nDATA: {event.data}\n{'='*50}\n")
-
-        # Debug: Show all events we receive when we have a thread
-        #if hasattr(st.session_state, 'current_thread_id'):
-            #st.write(f"**Event Type:** {event.event}")
-            #if event.event not in ['response.text.delta', 'response.thinking.delta']:  # Skip noisy events
-                #st.write(f"**Event Data:** {event.data[:500]}...")
-
-        # Debug: Show all events we receive
-        #if hasattr(st.session_state, 'current_thread_id'):
-            #st.write(f"**Debug Event:** {event.event} - Data: {event.data[:200]}...")
-
-        match event.event:
-            case "response.status":
-                spinner.__exit__(None, None, None)
-                data = StatusEventData.from_json(event.data)
-                spinner = st.spinner(data.message)
-                spinner.__enter__()
-            case "response.text.delta":
-                data = TextDeltaEventData.from_json(event.data)
-                buffers[data.content_index] += data.text
-                content_map[data.content_index].write(buffers[data.content_index])
-            case "response.thinking.delta":
-                data = ThinkingDeltaEventData.from_json(event.data)
-                buffers[data.content_index] += data.text
-                content_map[data.content_index].expander(
-                    "Thinking", expanded=True
-                ).write(buffers[data.content_index])
-            case "response.thinking":
-                # Thinking done, close the expander
-                data = ThinkingEventData.from_json(event.data)
-                content_map[data.content_index].expander("Thinking").write(data.text)
-            case "response.tool_use":
-                data = ToolUseEventData.from_json(event.data)
-                content_map[data.content_index].expander("Tool use").json(data)
-            case "response.tool_result":
-                data = ToolResultEventData.from_json(event.data)
-                content_map[data.content_index].expander("Tool result").json(data)
-            case "response.chart":
-                data = ChartEventData.from_json(event.data)
-                spec = json.loads(data.chart_spec)
-                content_map[data.content_index].vega_lite_chart(
-                    spec,
-                    use_container_width=True,
-                )
-            case "response.table":
-                data = TableEventData.from_json(event.data)
-                data_array = np.array(data.result_set.data)
-                column_names = [
-                    col.name for col in data.result_set.result_set_meta_data.row_type
-                ]
-                content_map[data.content_index].dataframe(
-                    pd.DataFrame(data_array, columns=column_names)
-                )
-            case "error":
-                data = ErrorEventData.from_json(event.data)
-                st.error(f"Error: {data.message} (code: {data.code})")
-                # Remove last user message, so we can retry from last successful response.
-                st.session_state.messages.pop()
-                return
-            case "metadata":
-                # Handle metadata events for thread message tracking
-                try:
-                    import json
-                    metadata = json.loads(event.data)
-                    #st.write(f"**Found metadata event:** {metadata}")
-                    # Track both user and assistant message IDs
-                    if 'metadata' in metadata and 'message_id' in metadata['metadata']:
-                        message_id = int(metadata['metadata'].get('message_id'))
-                        role = metadata['metadata'].get('role')
+    response_log_base = f"response_log_{thread_info}_{timestamp}"
+
+    if EVENT_QUEUE_SIZE > 0:
+        # Read the socket on a background thread so slow rendering does not stall the run
+        stream = QueuedEventStream(stream)
+    # Track the run so a new prompt or thread switch can cancel it; leaving the loop early
+    # (error event, rerun, stop) closes the connection instead of reading to the end
+    st.session_state.active_stream = stream
+    recorder = EventRecorder(response_log_base, {"thread_id": getattr(st.session_state, 'current_thread_id', None)})
+    if telemetry is None:
+        telemetry = RunTelemetry(AGENT, path=None)
+    try:
+        with stream, recorder, telemetry:
+            for event in events_within_deadlines(stream):
+                # Log raw event for comparison
+                recorder.record(event)
+                telemetry.observe(event)
+
+                # Debug: Show all events we receive when we have a thread
+                #if hasattr(st.session_state, 'current_thread_id'):
+                    #st.write(f"**Event Type:** {event.event}")
+                    #if event.event not in ['response.text.delta', 'response.thinking.delta']:  # Skip noisy events
+                        #st.write(f"**Event Data:** {event.data[:500]}...")
+
+                # Debug: Show all events we receive
+                #if hasattr(st.session_state, 'current_thread_id'):
+                    #st.write(f"**Debug Event:** {event.event} - Data: {event.data[:200]}...")
+
+                if event.event in STRUCTURAL_EVENTS:
+                    # Bring streamed text up to date before anything is drawn below it
+                    renderer.flush()
+
+                if render_event(event, pane, renderer, telemetry):
+                    continue
+
+                match event.event:
+                    case "response.status":
+                        spinner.__exit__(None, None, None)
+                        data = event.decode(StatusEventData)
+                        spinner = st.spinner(data.message)
+                        spinner.__enter__()
+                    case "error":
+                        data = event.decode(ErrorEventData)
+                        st.error(f"Error: {data.message} (code: {data.code})")
+                        # Remove last user message, so we can retry from last successful response.
+                        st.session_state.messages.pop()
+                        return
+                    case "metadata" if persist:
+                        # Handle metadata events for thread message tracking
+                        try:
+                            metadata = event.json()
+                            #st.write(f"**Found metadata event:** {metadata}")
+                            # Track both user and assistant message IDs
+                            if 'metadata' in metadata and 'message_id' in metadata['metadata']:
+                                message_id = int(metadata['metadata'].get('message_id'))
+                                role = metadata['metadata'].get('role')
                         
-                        if role == 'user':
-                            st.session_state.current_user_message_id = message_id
-                            # Save user message to database with complete JSON
-                            if hasattr(st.session_state, 'current_thread_data') and st.session_state.messages:
-                                user_message = st.session_state.messages[-1]  # Latest user message
-                                user_content = user_message.content[0].actual_instance.text if user_message.content else ''
-                                # Save complete message JSON structure
-                                user_message_json = user_message.to_json()
-                                save_thread_info(
-                                    st.session_state.current_thread_id,
-                                    st.session_state.current_thread_data.get('thread_name', ''),
-                                    message_id,
-                                    message_content=user_content.replace("'", "''"),  # Escape quotes
-                                    message_role='user',
-                                    message_json=user_message_json
-                                )
-                        elif role == 'assistant':
-                            st.session_state.current_assistant_message_id = message_id
-                            # The assistant's message_id becomes the parent_message_id for the next user message
-                            st.session_state.parent_message_id = message_id
+                                if role == 'user':
+                                    st.session_state.current_user_message_id = message_id
+                                    # Save user message to database with complete JSON (once, even if the run restarted)
+                                    if hasattr(st.session_state, 'current_thread_data') and st.session_state.messages and not user_message_saved:
+                                        user_message_saved = True
+                                        user_message = st.session_state.messages[-1]  # Latest user message
+                                        user_content = user_message.content[0].actual_instance.text if user_message.content else ''
+                                        # Save complete message JSON structure
+                                        user_message_json = user_message.to_json()
+                                        save_thread_info(
+                                            st.session_state.current_thread_id,
+                                            st.session_state.current_thread_data.get('thread_name', ''),
+                                            message_id,
+                                            message_content=user_content.replace("'", "''"),  # Escape quotes
+                                            message_role='user',
+                                            message_json=user_message_json
+                                        )
+                                elif role == 'assistant':
+                                    st.session_state.current_assistant_message_id = message_id
+                                    # The assistant's message_id becomes the parent_message_id for the next user message
+                                    st.session_state.parent_message_id = message_id
                             
-                        # Store all message IDs for tracking
-                        if not hasattr(st.session_state, 'message_ids_history'):
-                            st.session_state.message_ids_history = []
-                        st.session_state.message_ids_history.append({
-                            'role': role,
-                            'message_id': message_id
-                        })
-                except Exception as e:
-                    st.write(f"**Metadata parsing error:** {e}")
-            case "response":
-                data = Message.from_json(event.data)
-
-                # Create clean message for display (without thinking content)
-                clean_content = []
-                for content_item in data.content:
-                    if hasattr(content_item.actual_instance, 'type'):
-                        content_type = content_item.actual_instance.type
-                        if content_type != 'thinking':  # Exclude thinking from display
-                            clean_content.append(content_item)
-
-                clean_display_message = Message(
-                    role=data.role,
-                    content=clean_content
-                )
-
-                # Store clean message for display (no thinking)
-                st.session_state.messages.append(clean_display_message)
-
-                # Save assistant message to database if we have thread context
-                if (hasattr(st.session_state, 'current_thread_data') and
-                    hasattr(st.session_state, 'current_assistant_message_id') and
-                    st.session_state.current_assistant_message_id):
-
-                    # Create clean message WITHOUT thinking content for storage
-                    clean_content = []
-                    assistant_content = ''
-
-                    for content_item in data.content:
-                        # Skip thinking content - only store final response elements
-                        if hasattr(content_item.actual_instance, 'type'):
-                            content_type = content_item.actual_instance.type
-                            if content_type != 'thinking':  # Exclude thinking data
-                                clean_content.append(content_item)
-
-                                # Extract text for summary
-                                if hasattr(content_item.actual_instance, 'text'):
-                                    assistant_content += content_item.actual_instance.text
-
-                    # Create clean message object with only final response elements (no thinking)
-                    clean_message = Message(
-                        role=data.role,
-                        content=clean_content
+                                # Store all message IDs for tracking
+                                if not hasattr(st.session_state, 'message_ids_history'):
+                                    st.session_state.message_ids_history = []
+                                st.session_state.message_ids_history.append({
+                                    'role': role,
+                                    'message_id': message_id
+                                })
+                        except Exception as e:
+                            st.write(f"**Metadata parsing error:** {e}")
+                    case "response":
+                        # One decode gives the display message, the stored JSON and the summary text
+                        final = process_final_response(event.json())
+
+                        # Store clean message for display (no thinking)
+                        st.session_state.messages.append(final.message)
+
+                        # Save assistant message to database if we have thread context
+                        if (persist and
+                            hasattr(st.session_state, 'current_thread_data') and
+                            hasattr(st.session_state, 'current_assistant_message_id') and
+                            st.session_state.current_assistant_message_id):
+
+                            save_thread_info(
+                                st.session_state.current_thread_id,
+                                st.session_state.current_thread_data.get('thread_name', ''),
+                                st.session_state.current_assistant_message_id,
+                                message_content=final.summary.replace("'", "''"),  # Escape quotes
+                                message_role='assistant',
+                                message_json=final.message_json,  # Clean message without thinking
+                                response_json=final.response_json  # Complete response as received
+                            )
+                    case _:
+                        # Catch any other events we might not be handling
+                        if hasattr(st.session_state, 'current_thread_id'):
+                            a=1 #dummy statement to avoid warning
+                            #st.write(f" ")
+                            #st.write(f"**Unhandled event:** {event.event}")
+    finally:
+        # Also on an error event or a rerun: draw the text already received and let go of the run
+        renderer.flush()
+        st.session_state.active_stream = None
+        spinner.__exit__(None, None, None)
+
+
+def stream_fan_out(openers: dict) -> None:
+    """Run one prompt on several agents at once, each streamed into its own column"""
+    telemetries = {agent: RunTelemetry(agent) for agent in openers}
+
+    def open_stream(agent):
+        stream = openers[agent]()
+        telemetries[agent].connected(stream)
+        return stream
+
+    started = time.monotonic()
+    with st.spinner(f"Sending request to {len(openers)} agents..."):
+        opened = open_concurrently({agent: functools.partial(open_stream, agent) for agent in openers})
+
+    renderer = RenderScheduler()
+    try:
+        # Each agent gets its own column, content sections and streamed text
+        panes, statuses, footers, streams = {}, {}, {}, {}
+        for agent, column in zip(openers, st.columns(len(openers))):
+            column.markdown(f"**{agent}**")
+            result = opened[agent]
+            if isinstance(result, Exception):
+                telemetries[agent].finish(status=getattr(result, "code", type(result).__name__))
+                column.error(f"Error: {result}")
+                continue
+            column.caption(f"request_id: {result.headers.get('X-Snowflake-Request-Id')}")
+            statuses[agent] = column.empty()
+            panes[agent] = RunPane(column.container())
+            footers[agent] = column.empty()
+            streams[agent] = result
+
+        import datetime
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        stream = MultiplexedEventStream(streams)
+        st.session_state.active_stream = stream
+        with stream, contextlib.ExitStack() as stack:
+            recorders = {
+                agent: stack.enter_context(EventRecorder(f"response_log_fan_out_{agent}_{timestamp}", {"agent": agent}))
+                for agent in streams
+            }
+            for telemetry in telemetries.values():
+                stack.enter_context(telemetry)
+            for agent, event in stream:
+                telemetry = telemetries[agent]
+                if event is None:
+                    # This agent's run is over; the others carry on
+                    error = stream.errors.get(agent)
+                    if error is not None:
+                        code = getattr(error, "code", type(error).__name__)
+                        statuses[agent].error(f"Error: {error} (code: {code})")
+                    telemetry.finish(streams[agent], status=None if error is None else code)
+                    footers[agent].caption(
+                        f"first token {format_seconds(telemetry.first_text_s)} · total {format_seconds(telemetry.total_s)}"
                     )
+                    continue
+                recorders[agent].record(event)
+                telemetry.observe(event)
+                if event.event in STRUCTURAL_EVENTS:
+                    renderer.flush()
+                if render_event(event, panes[agent], renderer, telemetry):
+                    continue
+                match event.event:
+                    case "response.status":
+                        statuses[agent].caption(event.decode(StatusEventData).message)
+                    case "error":
+                        data = event.decode(ErrorEventData)
+                        statuses[agent].error(f"Error: {data.message} (code: {data.code})")
+                    case "response":
+                        statuses[agent].empty()
+    finally:
+        # Also on an exception or a rerun: draw the text already received and let go of every
+        # run, including any opened but not yet handed to the multiplexer
+        renderer.flush()
+        st.session_state.active_stream = None
+        for result in opened.values():
+            if not isinstance(result, Exception):
+                result.cancel("abandoned")
+
+    # Per-agent latency; the runs overlap, so the wall clock is close to the slowest of them
+    records = [telemetries[agent].record() for agent in openers]
+    st.dataframe(pd.DataFrame(
+        records,
+        columns=["agent", "status", "connect_s", "headers_s", "first_byte_s", "first_text_s", "total_s", "events", "request_id"],
+    ))
+    totals = [record["total_s"] or 0 for record in records]
+    st.caption(
+        f"Wall clock {time.monotonic() - started:.2f}s for {len(openers)} agents "
+        f"(slowest run {max(totals):.2f}s, sum of runs {sum(totals):.2f}s)"
+    )
+    st.session_state.last_run_telemetry = records
 
-                    # Save clean message JSON (without thinking) and complete response
-                    clean_message_json = clean_message.to_json()
-                    response_json = event.data  # Complete raw response as received
-
-                    save_thread_info(
-                        st.session_state.current_thread_id,
-                        st.session_state.current_thread_data.get('thread_name', ''),
-                        st.session_state.current_assistant_message_id,
-                        message_content=assistant_content.replace("'", "''"),  # Escape quotes
-                        message_role='assistant',
-                        message_json=clean_message_json,  # Clean message without thinking
-                        response_json=response_json
-                    )
 
-                # Check if this response contains message_id
-                try:
-                    response_data = json.loads(event.data)
-                    #st.write(f"**Response event data:** {response_data}")
-                except:
-                    pass
-            case _:
-                # Catch any other events we might not be handling
-                if hasattr(st.session_state, 'current_thread_id'):
-                    a=1 #dummy statement to avoid warning
-                    #st.write(f" ")
-                    #st.write(f"**Unhandled event:** {event.event}")
-    spinner.__exit__(None, None, None)
-
-    # Write raw response log
-    try:
-        with open(response_log_filename, 'w') as f:
-            f.write(f"=== RAW RESPONSE LOG ===\n")
-            f.write(f"Timestamp: {datetime.datetime.now()}\n")
-            f.write(f"Thread ID: {getattr(st.session_state, 'current_thread_id', 'None')}\n")
-            f.write(f"Total Events: {len(response_events)}\n")
-            f.write(f"\n=== RAW EVENT STREAM ===\n")
-            for event_log in response_events:
-                f.write(event_log)
-            f.write(f"\n=== END RESPONSE LOG ===\n")
-        print(f"Response logged to: {response_log_filename}")
-    except Exception as e:
-        print(f"Failed to log response: {e}")
+def format_seconds(seconds) -> str:
+    return "-" if seconds is None else f"{seconds:.2f}s"
+
+
+def cancel_active_run(reason: str) -> None:
+    """Cancel the agent run still streaming for this session, if any."""
+    stream = st.session_state.get("active_stream")
+    if stream is not None:
+        stream.cancel(reason)
+        st.session_state.active_stream = None
 
 
 def process_new_message(prompt: str) -> None:
+    cancel_active_run("new_prompt")
     message = Message(
         role="user",
         content=[MessageContentItem(TextContentItem(type="text", text=prompt))],
@@ -323,13 +512,51 @@ def process_new_message(prompt: str) -> None:
     render_message(message)
     st.session_state.messages.append(message)
 
+    if FANOUT_AGENTS:
+        # Comparison mode: every agent answers from the same history, without thread context;
+        # the turn is not added to the conversation
+        openers = {agent: prepare_agent_run(agent, use_thread=False) for agent in FANOUT_AGENTS}
+        st.session_state.messages.pop()
+        with st.chat_message("assistant"):
+            stream_fan_out(openers)
+        return
+
+    # A name picked at "Start New Thread" is sent now, alongside the first run
+    apply_pending_thread_name()
+
     with st.chat_message("assistant"):
         with st.spinner("Sending request..."):
-            response = agent_run()
+            telemetry = RunTelemetry(AGENT)
+            try:
+                stream = agent_run()
+                telemetry.connected(stream)
+            except RunDeadlineExceeded as e:
+                telemetry.finish(status=e.code)
+                st.error(f"Error: {e} (code: {e.code})")
+                st.session_state.messages.pop()
+                return
+            except AdmissionTimeout as e:
+                telemetry.finish(status="admission_timeout")
+                st.error(f"Error: too many runs in flight, try again shortly ({e})")
+                st.session_state.messages.pop()
+                return
+            except CortexThrottledError as e:
+                # Still 429 after the retries; the server said when it will take requests again
+                telemetry.finish(status="throttled")
+                wait = f"in {e.retry_after:g}s" if e.retry_after is not None else "shortly"
+                st.error(f"Error: the agent is rate limiting requests, try again {wait} (status: {e.status_code})")
+                st.session_state.messages.pop()
+                return
+            except CortexRequestError as e:
+                telemetry.finish(status=f"http_{e.status_code}")
+                st.error(f"Error: {e}")
+                st.session_state.messages.pop()
+                return
         st.markdown(
-            f"```request_id: {response.headers.get('X-Snowflake-Request-Id')}```"
+            f"```request_id: {stream.headers.get('X-Snowflake-Request-Id')}```"
         )
-        stream_events(response)
+        stream_events(stream, telemetry)
+        st.session_state.last_run_telemetry = telemetry.record()
 
 
 def render_message(msg: Message):
@@ -342,14 +569,11 @@ def render_message(msg: Message):
                     spec = json.loads(content_item.actual_instance.chart.chart_spec)
                     st.vega_lite_chart(spec, use_container_width=True)
                 case "table":
-                    data_array = np.array(
-                        content_item.actual_instance.table.result_set.data
-                    )
                     column_names = [
                         col.name
                         for col in content_item.actual_instance.table.result_set.result_set_meta_data.row_type
                     ]
-                    st.dataframe(pd.DataFrame(data_array, columns=column_names))
+                    st.dataframe(pd.DataFrame(content_item.actual_instance.table.result_set.data, columns=column_names))
                 case _:
                     st.expander(content_item.actual_instance.type).json(
                         content_item.actual_instance.to_json()
@@ -364,6 +588,7 @@ with st.sidebar:
     
     # Start New Thread button with functionality
     if st.button("Start New Thread"):
+        cancel_active_run("new_thread")
         custom_name = thread_name_input.strip() if thread_name_input.strip() else None
         thread_data = clear_chat_session(custom_name)
         if thread_data:
@@ -380,6 +605,7 @@ with st.sidebar:
         input_thread_id = st.number_input("Thread ID", min_value=1, step=1, format="%d")
         if st.button("Load Conversation"):
             if input_thread_id:
+                cancel_active_run("load_thread")
                 if load_conversation_context(input_thread_id):
                     st.success(f"Loaded thread {input_thread_id}")
                     st.rerun()
@@ -393,6 +619,7 @@ with st.sidebar:
             for thread in recent_threads[:5]:  # Show last 5 threads
                 thread_label = f"{thread['thread_name']} (ID: {thread['thread_id']}) - {thread['last_updated']}"
                 if st.button(thread_label, key=f"load_{thread['thread_id']}"):
+                    cancel_active_run("load_thread")
                     if load_conversation_context(thread['thread_id']):
                         st.success(f"Loaded: {thread['thread_name']}")
                         st.rerun()
@@ -400,7 +627,18 @@ with st.sidebar:
             st.write("No recent threads found")
     
     st.divider()
-    
+
+    # Keep-alive pool effectiveness for the shared Cortex HTTP session
+    with st.expander("Connection Pool"):
+        st.write(connection_stats())
+        st.write(admission.stats())
+        # Reader-to-render backlog of the last runs
+        st.write({name: value for name, value in metrics.snapshot().items() if name.startswith("event_queue")})
+
+    # Where the seconds of the last run went (every run is also appended to TELEMETRY_PATH)
+    with st.expander("Last Run Timing"):
+        st.write(st.session_state.get("last_run_telemetry", "No runs yet"))
+
     # Show current thread metadata if exists
     if hasattr(st.session_state, 'current_thread_data'):
         st.write(f"**Thread Data:** {st.session_state.current_thread_data}")
@@ -416,6 +654,9 @@ with st.sidebar:
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# Keep pre-created threads ready so "Start New Thread" needs no round trip
+thread_pool.refill()
+
 for message in st.session_state.messages:
     render_message(message)
 
@@ -0,0 +1,394 @@
+"""Local stand-in for the Cortex Agent REST API.
+
+Serves the `:run` endpoint and `/api/v2/cortex/threads` with synthetic but schema-valid
+events (every event type modelled in `models/`), so `agent_run()` + `stream_events()`
+can be benchmarked and regression-tested without a Snowflake account.
+
+    python mock_cortex_server.py --port 8080 --tokens-per-second 200
+
+Point the app at it with:
+
+    CORTEX_AGENT_DEMO_HOST=localhost:8080
+    CORTEX_AGENT_DEMO_SCHEME=http
+"""
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RUN_PATH = re.compile(r"^/api/v2/databases/[^/]+/schemas/[^/]+/agents/[^/:]+:run$")
+THREADS_PATH = "/api/v2/cortex/threads"
+THREAD_PATH = re.compile(r"^/api/v2/cortex/threads/(\d+)$")
+# Generated runs kept so a reconnect with Last-Event-ID resumes the same run
+RUN_CACHE_SIZE = 64
+
+WORDS = (
+    "revenue pipeline quarter region account renewal forecast growth deal "
+    "margin customer segment churn target booking trend product"
+).split()
+
+
+def _tokens(rng, count, token_size):
+    for _ in range(count):
+        word = rng.choice(WORDS)
+        yield (word + " ") if token_size <= 0 else (word + " ").ljust(token_size)
+
+
+def _result_set(rng, rows, cols, query_id):
+    row_type = [
+        {"name": f"COL_{i}", "type": "text" if i == 0 else "fixed",
+         "length": 0, "precision": 38, "scale": 0, "nullable": True}
+        for i in range(cols)
+    ]
+    data = [
+        [rng.choice(WORDS).upper()] + [str(rng.randint(0, 100000)) for _ in range(cols - 1)]
+        for _ in range(rows)
+    ]
+    return {
+        "statementHandle": query_id,
+        "resultSetMetaData": {"partition": 0, "numRows": rows, "format": "jsonv2", "rowType": row_type},
+        "data": data,
+    }
+
+
+def build_run(config, rng, thread_id, message_ids):
+    """Return the list of (event, data) pairs for one run, in order"""
+    tool_use_id = f"toolu_{rng.randrange(10**8):08d}"
+    query_id = f"01b{rng.randrange(16**12):012x}"
+    sql = "SELECT region, SUM(amount) AS revenue FROM sales GROUP BY region ORDER BY revenue DESC"
+    result_set = _result_set(rng, config.table_rows, config.table_cols, query_id)
+    chart_spec = json.dumps({
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "mark": "bar",
+        "encoding": {"x": {"field": "COL_0", "type": "nominal"}, "y": {"field": "COL_1", "type": "quantitative"}},
+        "data": {"values": [{"COL_0": row[0], "COL_1": row[1]} for row in result_set["data"][:50]]},
+    })
+    tool_input = {"query": "revenue by region"}
+    tool_content = [{"type": "json", "json": {"sql": sql, "text": "Revenue by region", "query_id": query_id}}]
+
+    events = []
+    if thread_id is not None:
+        events.append(("metadata", {"metadata": {"role": "user", "message_id": next(message_ids)}}))
+    events.append(("response.status", {"status": "planning", "message": "Planning the next steps"}))
+
+    thinking = []
+    for token in _tokens(rng, config.thinking_tokens, config.token_size):
+        thinking.append(token)
+        events.append(("response.thinking.delta", {"content_index": 0, "text": token}))
+    events.append(("response.thinking", {"content_index": 0, "text": "".join(thinking)}))
+
+    events.append(("response.tool_use", {
+        "content_index": 1, "tool_use_id": tool_use_id, "type": "cortex_analyst_text2sql",
+        "name": "sales_analyst", "input": tool_input,
+    }))
+    events.append(("response.tool_result.status", {
+        "tool_use_id": tool_use_id, "tool_type": "cortex_analyst_text2sql",
+        "status": "executing_sql", "message": "Executing SQL",
+    }))
+    analyst_deltas = [
+        {"think": "Looking at the sales table. "},
+        {"text": "This is revenue by region. "},
+        {"sql": sql},
+        {"sql_explanation": "Sums revenue per region."},
+        {"query_id": query_id, "verified_query_used": False},
+        {"result_set": result_set},
+    ]
+    for delta in analyst_deltas:
+        events.append(("response.tool_result.analyst.delta", {
+            "content_index": 2, "tool_use_id": tool_use_id, "tool_type": "cortex_analyst_text2sql",
+            "tool_name": "sales_analyst", "delta": delta,
+        }))
+    events.append(("response.tool_result", {
+        "content_index": 2, "tool_use_id": tool_use_id, "type": "cortex_analyst_text2sql",
+        "name": "sales_analyst", "content": tool_content, "status": "success",
+    }))
+    events.append(("response.table", {
+        "content_index": 3, "tool_use_id": tool_use_id, "query_id": query_id,
+        "result_set": result_set, "title": "Revenue by region",
+    }))
+    events.append(("response.chart", {"content_index": 4, "tool_use_id": tool_use_id, "chart_spec": chart_spec}))
+
+    text = []
+    for token in _tokens(rng, config.text_tokens, config.token_size):
+        text.append(token)
+        events.append(("response.text.delta", {"content_index": 5, "text": token}))
+    answer = "".join(text)
+    events.append(("response.text", {"content_index": 5, "text": answer}))
+    events.append(("response.text.annotation", {
+        "content_index": 5, "annotation_index": 0,
+        "annotation": {"type": "cortex_search_citation", "index": 0, "search_result_id": "sr_0",
+                       "doc_id": "doc_0", "doc_title": "Call notes", "text": "Q3 call"},
+    }))
+    events.append(("response.suggested_queries", {
+        "content_index": 6, "suggested_queries": [{"query": "Show revenue by product"}],
+    }))
+    if thread_id is not None:
+        events.append(("metadata", {"metadata": {"role": "assistant", "message_id": next(message_ids)}}))
+    events.append(("response", {
+        "role": "assistant",
+        "content": [
+            {"type": "thinking", "thinking": {"text": "".join(thinking)}},
+            {"type": "tool_use", "tool_use": {"tool_use_id": tool_use_id, "type": "cortex_analyst_text2sql",
+                                               "name": "sales_analyst", "input": tool_input}},
+            {"type": "tool_result", "tool_result": {"tool_use_id": tool_use_id, "type": "cortex_analyst_text2sql",
+                                                     "name": "sales_analyst", "content": tool_content,
+                                                     "status": "success"}},
+            {"type": "table", "table": {"tool_use_id": tool_use_id, "query_id": query_id,
+                                         "result_set": result_set, "title": "Revenue by region"}},
+            {"type": "chart", "chart": {"tool_use_id": tool_use_id, "chart_spec": chart_spec}},
+            {"type": "text", "text": answer},
+        ],
+    }))
+    return events
+
+
+class MockCortexHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockCortex/1.0"
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+    def _read_body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            body = self._read_chunked()
+        else:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+        self.server.count("request_bytes", len(body))
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            try:
+                body = gzip.decompress(body)
+            except (OSError, EOFError) as e:
+                raise ValueError(f"Invalid gzip body: {e}") from e
+        return json.loads(body) if body else {}
+
+    def _read_chunked(self):
+        parts = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+            if size == 0:
+                # Skip trailers up to the blank line ending the body
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(parts)
+            parts.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _inject_http_failure(self):
+        """Return True if a 429/500 was sent instead of serving the request"""
+        rng = self.server.rng
+        if rng.random() < self.config.throttle_rate:
+            self.server.count("throttled")
+            self._send_json(429, {"code": "429", "message": "Too many requests"},
+                            {"Retry-After": str(self.config.retry_after)})
+            return True
+        if rng.random() < self.config.http_error_rate:
+            self.server.count("http_errors")
+            self._send_json(500, {"code": "500", "message": "Injected server error"})
+            return True
+        return False
+
+    def do_POST(self):
+        try:
+            request = self._read_body()
+        except ValueError:
+            self._send_json(400, {"code": "400", "message": "Invalid JSON body"})
+            return
+        if self._inject_http_failure():
+            return
+        if RUN_PATH.match(self.path):
+            self._run(request)
+        elif self.path == THREADS_PATH:
+            thread_id = next(self.server.thread_ids)
+            self.server.count("threads_created")
+            self._send_json(200, {
+                "thread_id": thread_id,
+                "thread_name": "",
+                "origin_application": request.get("origin_application", ""),
+                "created_on": int(time.time() * 1000),
+            })
+        elif THREAD_PATH.match(self.path):
+            self._send_json(200, {"status": f"Thread {THREAD_PATH.match(self.path).group(1)} successfully updated."})
+        else:
+            self._send_json(404, {"code": "404", "message": f"Unknown path {self.path}"})
+
+    def do_DELETE(self):
+        if THREAD_PATH.match(self.path):
+            self._send_json(200, {"status": "Thread successfully deleted."})
+        else:
+            self._send_json(404, {"code": "404", "message": f"Unknown path {self.path}"})
+
+    def _run(self, request):
+        config = self.config
+        rng = random.Random(self.server.rng.random())
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+        # Event ids let clients resume with Last-Event-ID after a dropped connection
+        start = 0
+        last_event_id = self.headers.get("Last-Event-ID")
+        events = None
+        if config.event_ids and last_event_id and last_event_id.isdigit():
+            start = int(last_event_id) + 1
+            self.server.count("resumes")
+            # Continue the run this request started, not a newly generated one
+            events = self.server.cached_run(key)
+        if events is None:
+            events = build_run(config, rng, request.get("thread_id"), self.server.message_ids)
+            self.server.cache_run(key, events)
+            self.server.count("runs")
+
+        fail_at = None
+        failure = None
+        roll = rng.random()
+        if roll < config.drop_rate:
+            failure = "drop"
+        elif roll < config.drop_rate + config.error_event_rate:
+            failure = "error"
+        elif roll < config.drop_rate + config.error_event_rate + config.stall_rate:
+            failure = "stall"
+        if failure:
+            fail_at = rng.randrange(start, len(events))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Snowflake-Request-Id", f"mock-{rng.randrange(16**8):08x}")
+        self.end_headers()
+
+        delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        time.sleep(config.first_event_delay)
+        try:
+            for index in range(start, len(events)):
+                if index == fail_at:
+                    self.server.count(f"injected_{failure}")
+                    if failure == "drop":
+                        # Abort without the terminating chunk, like a reset connection
+                        self.connection.shutdown(socket.SHUT_RDWR)
+                        self.close_connection = True
+                        return
+                    if failure == "error":
+                        self._write_event("error", {"code": "399504", "message": "Injected error",
+                                                    "request_id": "mock"}, index)
+                        break
+                    time.sleep(config.stall_seconds)
+                event, data = events[index]
+                self._write_event(event, data, index)
+                if event.endswith(".delta") and delay:
+                    time.sleep(delay)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the run
+            self.server.count("client_disconnects")
+            self.close_connection = True
+
+    def _write_event(self, event, data, index):
+        lines = []
+        if self.config.event_ids:
+            lines.append(f"id: {index}")
+        lines.append(f"event: {event}")
+        lines.append(f"data: {json.dumps(data)}")
+        self._write_chunk(("\n".join(lines) + "\n\n").encode())
+
+
+class MockCortexServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, MockCortexHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.thread_ids = itertools.count(1000)
+        self.message_ids = itertools.count(1)
+        self.counters = {}
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def cache_run(self, key, events):
+        with self._lock:
+            self._runs[key] = events
+            self._runs.move_to_end(key)
+            while len(self._runs) > RUN_CACHE_SIZE:
+                self._runs.popitem(last=False)
+
+    def cached_run(self, key):
+        with self._lock:
+            return self._runs.get(key)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Cortex Agent server for offline benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for reproducible runs")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0,
+                        help="Rate of delta events; 0 streams as fast as possible")
+    parser.add_argument("--first-event-delay", type=float, default=0.0,
+                        help="Seconds before the first event is sent")
+    parser.add_argument("--text-tokens", type=int, default=200, help="Number of response.text.delta events")
+    parser.add_argument("--thinking-tokens", type=int, default=100, help="Number of response.thinking.delta events")
+    parser.add_argument("--token-size", type=int, default=0,
+                        help="Pad each token to this many characters (0 keeps natural words)")
+    parser.add_argument("--table-rows", type=int, default=20)
+    parser.add_argument("--table-cols", type=int, default=4)
+    parser.add_argument("--event-ids", action="store_true",
+                        help="Send SSE ids and honour Last-Event-ID on reconnect")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability a run's connection is cut mid-stream")
+    parser.add_argument("--error-event-rate", type=float, default=0.0,
+                        help="Probability a run ends with an error event")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Probability a run stalls mid-stream")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability a request gets a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="Probability a request gets a 500")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    server = MockCortexServer((config.host, config.port), config)
+    print(f"Mock Cortex Agent server listening on http://{config.host}:{config.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Counters: {server.counters}")
+
+
+if __name__ == "__main__":
+    main()
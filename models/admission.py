@@ -0,0 +1,164 @@
+import collections
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from models import metrics
+
+load_dotenv('env.dev')
+
+# Sustained request rate (per second), burst size and runs in flight across the process
+RATE_LIMIT = float(os.getenv("CORTEX_AGENT_DEMO_RATE_LIMIT", "5"))
+RATE_BURST = float(os.getenv("CORTEX_AGENT_DEMO_RATE_BURST", "10"))
+MAX_CONCURRENCY = int(os.getenv("CORTEX_AGENT_DEMO_MAX_CONCURRENCY", "8"))
+# Longest an interactive call (a run, thread create/rename/delete) waits for admission, in seconds
+ADMISSION_TIMEOUT = float(os.getenv("CORTEX_AGENT_DEMO_ADMISSION_TIMEOUT", "30"))
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a request waited longer than its admission timeout"""
+
+
+class Slot:
+    """A granted admission; release it when the request (or its stream) is done"""
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    """Token bucket plus concurrency limit in front of Cortex calls.
+
+    Waiting requests are queued per user and admitted round-robin across users, so one
+    user's burst cannot starve the others. `defer(seconds)` pauses admissions after a 429
+    with `Retry-After`.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, max_concurrency=MAX_CONCURRENCY):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._queues = collections.OrderedDict()  # user -> deque of waiting tickets
+        self._tokens = burst
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _queue_depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next_wait(self, now):
+        """Seconds until admission could become possible, or None to wait for a release"""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= self.max_concurrency:
+            return None
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0.0
+
+    def acquire(self, user="default_user", timeout=None) -> Slot:
+        """Block until this request may be sent and return its slot"""
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            self._queues.setdefault(user, collections.deque()).append(ticket)
+            metrics.set_gauge("admission.queue_depth", self._queue_depth())
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    head_user = next(iter(self._queues))
+                    is_next = head_user == user and self._queues[user][0] is ticket
+                    # Only the head of the line watches the clock; the rest wake when it is admitted
+                    wait = self._next_wait(now) if is_next else None
+                    if wait == 0.0:
+                        break
+                    if timeout is not None:
+                        remaining = started + timeout - now
+                        if remaining <= 0:
+                            metrics.increment("admission.timeouts")
+                            raise AdmissionTimeout(f"Waited {timeout}s for admission")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            except BaseException:
+                self._remove(user, ticket)
+                self._cond.notify_all()
+                raise
+
+            self._remove(user, ticket)
+            if user in self._queues:
+                # Round-robin: this user goes to the back of the line
+                self._queues.move_to_end(user)
+            self._tokens -= 1
+            self._in_flight += 1
+            metrics.set_gauge("admission.in_flight", self._in_flight)
+            self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        metrics.observe("admission.wait_seconds", waited)
+        return Slot(self)
+
+    def _remove(self, user, ticket):
+        """Drop a ticket from its user's queue; caller holds the lock"""
+        queue = self._queues.get(user)
+        if queue is not None:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[user]
+        metrics.set_gauge("admission.queue_depth", self._queue_depth())
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            metrics.set_gauge("admission.in_flight", self._in_flight)
+            self._cond.notify_all()
+
+    def defer(self, seconds):
+        """Hold all admissions for `seconds` (server asked us to back off)"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            metrics.increment("admission.deferrals")
+            self._cond.notify_all()
+
+    def stats(self):
+        """Current queue depth, runs in flight and wait-time summary"""
+        with self._cond:
+            self._refill(time.monotonic())
+            state = {
+                "queue_depth": self._queue_depth(),
+                "in_flight": self._in_flight,
+                "tokens": round(self._tokens, 2),
+                "users_waiting": len(self._queues),
+            }
+        snapshot = metrics.snapshot()
+        for name in ("count", "avg", "max"):
+            state[f"wait_seconds.{name}"] = snapshot.get(f"admission.wait_seconds.{name}", 0)
+        return state
+
+
+def session_user(default="default_user"):
+    """Admission key of the calling Streamlit browser session; `default` off the script thread"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return default
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return f"session-{ctx.session_id}" if ctx is not None else default
+
+
+# Shared by every Cortex call in the process
+admission = AdmissionController()
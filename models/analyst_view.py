@@ -0,0 +1,88 @@
+import pandas as pd
+
+from models import CortexAnalystToolResultDelta
+from models.delta_buffer import DeltaBuffer
+
+# Order the parts of an Analyst result are laid out in, whatever order they arrive in
+SECTIONS = ("think", "text", "sql", "sql_explanation", "query_id", "result_set", "suggestions")
+
+
+class AnalystAccumulator:
+    """Merges the `response.tool_result.analyst.delta` events of one Cortex Analyst tool use.
+
+    Text-like fields (`think`, `text`, `sql`, `sql_explanation` and each suggestion) are
+    appended; `query_id`, `verified_query_used` and `result_set` replace what came before.
+    `changed` holds the sections updated since it was last cleared.
+    """
+
+    def __init__(self, tool_use_id):
+        self.tool_use_id = tool_use_id
+        self.think = DeltaBuffer()
+        self.text = DeltaBuffer()
+        self.sql = DeltaBuffer()
+        self.sql_explanation = DeltaBuffer()
+        self.query_id = None
+        self.verified_query_used = None
+        self.result_set = None
+        self.suggestions = {}
+        self.changed = set()
+
+    def merge(self, delta: CortexAnalystToolResultDelta):
+        for name in ("think", "text", "sql", "sql_explanation"):
+            value = getattr(delta, name)
+            if value:
+                getattr(self, name).append(value)
+                self.changed.add(name)
+        if delta.query_id is not None or delta.verified_query_used is not None:
+            self.query_id = delta.query_id or self.query_id
+            if delta.verified_query_used is not None:
+                self.verified_query_used = delta.verified_query_used
+            self.changed.add("query_id")
+        if delta.result_set is not None:
+            self.result_set = delta.result_set
+            self.changed.add("result_set")
+        if delta.suggestions is not None:
+            self.suggestions.setdefault(delta.suggestions.index, DeltaBuffer()).append(delta.suggestions.delta)
+            self.changed.add("suggestions")
+
+
+class AnalystView(AnalystAccumulator):
+    """Renders an Analyst tool use into a Streamlit placeholder, part by part as deltas arrive.
+
+    Only the sections that changed since the last `render()` are redrawn, so the SQL shows
+    as soon as it is generated and the result set as soon as the query returns, without
+    waiting for `response.tool_result` or `response.table`.
+    """
+
+    def __init__(self, tool_use_id, placeholder):
+        super().__init__(tool_use_id)
+        self._placeholder = placeholder
+        self._sections = None
+
+    def render(self):
+        if not self.changed:
+            return
+        if self._sections is None:
+            container = self._placeholder.expander("Cortex Analyst", expanded=True)
+            self._sections = {name: container.empty() for name in SECTIONS}
+        for name in self.changed:
+            section = self._sections[name]
+            match name:
+                case "think":
+                    section.caption(str(self.think))
+                case "text" | "sql_explanation":
+                    section.markdown(str(getattr(self, name)))
+                case "sql":
+                    section.code(str(self.sql), language="sql")
+                case "query_id":
+                    verified = " (verified query)" if self.verified_query_used else ""
+                    section.caption(f"Query ID: {self.query_id or 'pending'}{verified}")
+                case "result_set":
+                    meta_data = self.result_set.result_set_meta_data
+                    columns = [col.name for col in meta_data.row_type] if meta_data and meta_data.row_type else None
+                    section.dataframe(pd.DataFrame(self.result_set.data, columns=columns))
+                case "suggestions":
+                    section.markdown("\n".join(
+                        f"- {self.suggestions[index]}" for index in sorted(self.suggestions)
+                    ))
+        self.changed.clear()
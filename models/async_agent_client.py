@@ -0,0 +1,214 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+
+from models import (
+    AnalystToolResultDeltaEvent,
+    ChartEvent,
+    DataAgentRunRequest,
+    ErrorEvent,
+    ResponseEvent,
+    ResponseTextAnnotationEvent,
+    ServerSentEvent,
+    StatusEvent,
+    SuggestedQueriesEvent,
+    TableEvent,
+    TextDeltaEvent,
+    TextEvent,
+    ThinkingDeltaEvent,
+    ThinkingEvent,
+    ToolResultEvent,
+    ToolResultStatusEvent,
+    ToolUseEvent,
+    json_codec,
+)
+from models.admission import admission
+from models.deadlines import (
+    CONNECT_TIMEOUT,
+    FIRST_EVENT_TIMEOUT,
+    IDLE_TIMEOUT,
+    ConnectDeadlineExceeded,
+    FirstEventDeadlineExceeded,
+    IdleDeadlineExceeded,
+    exceeded,
+)
+from models.http_client import (
+    DEFAULT_RETRY_AFTER,
+    POOL_MAXSIZE,
+    THROTTLE_RETRIES,
+    CortexRequestError,
+    CortexThrottledError,
+    parse_retry_after,
+)
+from models.request_body import RequestBody
+from models.sse_parser import SSEParser
+
+load_dotenv('env.dev')
+
+PAT = os.getenv("CORTEX_AGENT_DEMO_PAT")
+HOST = os.getenv("CORTEX_AGENT_DEMO_HOST")
+# "http" lets the app talk to mock_cortex_server.py
+SCHEME = os.getenv("CORTEX_AGENT_DEMO_SCHEME", "https")
+DATABASE = os.getenv("CORTEX_AGENT_DEMO_DATABASE", "SNOWFLAKE_INTELLIGENCE")
+SCHEMA = os.getenv("CORTEX_AGENT_DEMO_SCHEMA", "AGENTS")
+AGENT = os.getenv("CORTEX_AGENT_DEMO_AGENT", "SALES_INTELLIGENCE_AGENT")
+
+# SSE event name to the typed event wrapped by ServerSentEvent
+EVENT_TYPES = {
+    "error": ErrorEvent,
+    "response": ResponseEvent,
+    "response.chart": ChartEvent,
+    "response.status": StatusEvent,
+    "response.suggested_queries": SuggestedQueriesEvent,
+    "response.table": TableEvent,
+    "response.text": TextEvent,
+    "response.text.annotation": ResponseTextAnnotationEvent,
+    "response.text.delta": TextDeltaEvent,
+    "response.thinking": ThinkingEvent,
+    "response.thinking.delta": ThinkingDeltaEvent,
+    "response.tool_result": ToolResultEvent,
+    "response.tool_result.analyst.delta": AnalystToolResultDeltaEvent,
+    "response.tool_result.status": ToolResultStatusEvent,
+    "response.tool_use": ToolUseEvent,
+}
+
+# Admission waits block a worker thread here instead of the event loop
+_admission_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="cortex-admission")
+
+
+async def _acquire_slot(user):
+    future = _admission_executor.submit(admission.acquire, user)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # The wait keeps going in its thread; hand the slot straight back once granted
+        future.add_done_callback(lambda f: f.exception() is None and f.result().release())
+        raise
+
+
+class AsyncAgentClient:
+    """Asyncio client for the Cortex Agent :run endpoint.
+
+    One client (and its connection pool) can drive many concurrent runs:
+
+        async with AsyncAgentClient() as client:
+            async for event in client.run(request):
+                ...
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        pat: Optional[str] = None,
+        database: Optional[str] = None,
+        schema: Optional[str] = None,
+        agent: Optional[str] = None,
+        scheme: Optional[str] = None,
+        user: str = "default_user",
+        max_connections: int = POOL_MAXSIZE,
+        verify_ssl: bool = False,
+    ):
+        self.host = host or HOST
+        self.pat = pat or PAT
+        self.database = database or DATABASE
+        self.schema = schema or SCHEMA
+        self.agent = agent or AGENT
+        self.scheme = scheme or SCHEME
+        self.user = user
+        self.max_connections = max_connections
+        self.verify_ssl = verify_ssl
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so the session binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                ssl=None if self.verify_ssl else False,
+            )
+            # Runs can stream for minutes, so no overall deadline here; first-event and idle
+            # deadlines are enforced per read in events()
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://{self.host}/api/v2/databases/{self.database}/schemas/{self.schema}/agents/{self.agent}:run"
+
+    async def events(self, request: DataAgentRunRequest) -> AsyncIterator[Tuple[str, bytes]]:
+        """Yield raw (event, data bytes) pairs from a run, including events without a model such as metadata"""
+        body = RequestBody(request)
+        for attempt in range(THROTTLE_RETRIES + 1):
+            slot = await _acquire_slot(self.user)
+            try:
+                started = time.monotonic()
+                async with self._get_session().post(
+                    self.url,
+                    data=body.aiter(),
+                    headers={
+                        "Authorization": f"Bearer {self.pat}",
+                        "Content-Type": "application/json",
+                        **body.headers,
+                    },
+                ) as resp:
+                    if resp.status == 429:
+                        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                        admission.defer(DEFAULT_RETRY_AFTER if retry_after is None else retry_after)
+                        if attempt < THROTTLE_RETRIES:
+                            continue
+                        raise CortexThrottledError(resp.status, await resp.text(), retry_after)
+                    if resp.status >= 400:
+                        raise CortexRequestError(resp.status, await resp.text())
+
+                    parser = SSEParser()
+                    first_event = True
+                    while True:
+                        if first_event:
+                            deadline = FIRST_EVENT_TIMEOUT - (time.monotonic() - started)
+                        else:
+                            deadline = IDLE_TIMEOUT
+                        try:
+                            chunk = await asyncio.wait_for(resp.content.readany(), max(deadline, 0.0))
+                        except asyncio.TimeoutError:
+                            if first_event:
+                                raise exceeded(FirstEventDeadlineExceeded, FIRST_EVENT_TIMEOUT) from None
+                            raise exceeded(IdleDeadlineExceeded, IDLE_TIMEOUT) from None
+                        if not chunk:
+                            break
+                        for event, data, _ in parser.feed(chunk):
+                            # Only a complete event meets the first-event deadline, not a keep-alive or partial line
+                            first_event = False
+                            yield event, data
+                    return
+            except aiohttp.ServerTimeoutError as e:
+                # Raised by the sock_connect timeout; read deadlines are handled above
+                raise exceeded(ConnectDeadlineExceeded, CONNECT_TIMEOUT) from e
+            finally:
+                slot.release()
+
+    async def run(self, request: DataAgentRunRequest) -> AsyncIterator[ServerSentEvent]:
+        """Yield typed events from a run; events without a model (e.g. metadata) are skipped"""
+        async for event, data in self.events(request):
+            event_cls = EVENT_TYPES.get(event)
+            if event_cls is None:
+                continue
+            yield ServerSentEvent(event_cls.from_dict({"event": event, "data": json_codec.loads(data)}))
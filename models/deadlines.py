@@ -0,0 +1,47 @@
+import os
+
+from dotenv import load_dotenv
+
+from models import metrics
+
+load_dotenv('env.dev')
+
+# Seconds allowed to open the connection, to receive the first event, and between two events
+CONNECT_TIMEOUT = float(os.getenv("CORTEX_AGENT_DEMO_CONNECT_TIMEOUT", "10"))
+FIRST_EVENT_TIMEOUT = float(os.getenv("CORTEX_AGENT_DEMO_FIRST_EVENT_TIMEOUT", "60"))
+IDLE_TIMEOUT = float(os.getenv("CORTEX_AGENT_DEMO_IDLE_TIMEOUT", "120"))
+
+
+class RunDeadlineExceeded(Exception):
+    """An agent run missed one of its deadlines"""
+    code = "deadline_exceeded"
+    counter = "deadline.exceeded"
+    description = "deadline"
+
+    def __init__(self, seconds):
+        super().__init__(f"No {self.description} within {seconds:g}s")
+        self.seconds = seconds
+
+
+class ConnectDeadlineExceeded(RunDeadlineExceeded):
+    code = "connect_timeout"
+    counter = "deadline.connect"
+    description = "connection"
+
+
+class FirstEventDeadlineExceeded(RunDeadlineExceeded):
+    code = "first_event_timeout"
+    counter = "deadline.first_event"
+    description = "first event"
+
+
+class IdleDeadlineExceeded(RunDeadlineExceeded):
+    code = "idle_timeout"
+    counter = "deadline.idle"
+    description = "event"
+
+
+def exceeded(error_cls, seconds) -> RunDeadlineExceeded:
+    """Count a missed deadline and return the error to raise"""
+    metrics.increment(error_cls.counter)
+    return error_cls(seconds)
@@ -0,0 +1,92 @@
+FENCE = "```"
+PARAGRAPH_BREAK = "\n\n"
+
+
+class DeltaBuffer:
+    """Append-only text built from deltas; parts are only joined when the text is read"""
+
+    def __init__(self, text=""):
+        self._parts = [text] if text else []
+        self._length = len(text)
+
+    def append(self, text):
+        self._parts.append(text)
+        self._length += len(text)
+
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        if len(self._parts) > 1:
+            # Keep the joined text so the next read only joins what arrived since
+            self._parts[:] = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+
+def _freeze_point(text):
+    """End of the last paragraph that is complete and outside a code fence, or 0"""
+    cut = text.rfind(PARAGRAPH_BREAK)
+    while cut > 0 and text.count(FENCE, 0, cut) % 2:
+        cut = text.rfind(PARAGRAPH_BREAK, 0, cut)
+    return cut + len(PARAGRAPH_BREAK) if cut > 0 else 0
+
+
+class StreamingText:
+    """Markdown for one content index, rendered into a Streamlit placeholder as deltas arrive.
+
+    Finished paragraphs are written once into elements of their own; each `render()` only
+    rewrites the element holding the paragraph still being streamed, so the text sent to the
+    browser per update stays the size of a paragraph rather than the whole answer. Paragraphs
+    inside an open code fence are held back until it closes, since they only render together.
+    """
+
+    def __init__(self, placeholder, container=None):
+        self._placeholder = placeholder
+        self._make_container = container or (lambda placeholder: placeholder.container())
+        self._frozen = []
+        self._frozen_length = 0
+        self._open = DeltaBuffer()
+        self._container = None
+        self._tail = None
+        self._dirty = False
+
+    def append(self, text):
+        self._open.append(text)
+        self._dirty = True
+
+    def __len__(self):
+        return self._frozen_length + len(self._open)
+
+    @property
+    def text(self):
+        return "".join(self._frozen) + str(self._open)
+
+    def render(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        if self._container is None:
+            # Replaces whatever the placeholder showed before
+            self._container = self._make_container(self._placeholder)
+            self._tail = self._container.empty()
+        pending = str(self._open)
+        cut = _freeze_point(pending)
+        if cut:
+            self._tail.write(pending[:cut])
+            self._frozen.append(pending[:cut])
+            self._frozen_length += cut
+            self._tail = self._container.empty()
+            pending = pending[cut:]
+            self._open = DeltaBuffer(pending)
+        if pending:
+            self._tail.write(pending)
+
+    def restart(self):
+        """Forget the text but leave it on screen; the next render replaces it"""
+        text = self.text
+        self._frozen = []
+        self._frozen_length = 0
+        self._open = DeltaBuffer()
+        self._container = self._tail = None
+        self._dirty = False
+        return text
@@ -0,0 +1,51 @@
+import os
+from typing import NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from models import TextDeltaEventData, ThinkingDeltaEventData
+
+load_dotenv('env.dev')
+
+# "true" decodes every delta through its pydantic model, as the other events are
+STRICT_EVENTS = os.getenv("CORTEX_AGENT_DEMO_STRICT_EVENTS", "false").lower() == "true"
+
+
+class TextDelta(NamedTuple):
+    """The fields of a text delta event, read without building a pydantic model"""
+    content_index: int
+    text: str
+    is_elicitation: Optional[bool] = None
+
+
+class ThinkingDelta(NamedTuple):
+    """The fields of a thinking delta event, read without building a pydantic model"""
+    content_index: int
+    text: str
+
+
+def decode_text_delta(event, strict=STRICT_EVENTS):
+    """Decode a `response.text.delta` event; a TextDeltaEventData in strict mode, else a TextDelta.
+
+    Reads `event.json()`, so data already parsed (e.g. by the recorder) is not parsed again.
+    """
+    obj = event.json()
+    if strict:
+        return TextDeltaEventData.from_dict(obj)
+    content_index, text = obj.get("content_index"), obj.get("text")
+    is_elicitation = obj.get("is_elicitation")
+    # Same checks as the model's StrictInt/StrictStr fields; let pydantic report anything else
+    if type(content_index) is not int or type(text) is not str or not (is_elicitation is None or type(is_elicitation) is bool):
+        return TextDeltaEventData.from_dict(obj)
+    return TextDelta(content_index, text, is_elicitation)
+
+
+def decode_thinking_delta(event, strict=STRICT_EVENTS):
+    """Decode a `response.thinking.delta` event; a ThinkingDeltaEventData in strict mode, else a ThinkingDelta"""
+    obj = event.json()
+    if strict:
+        return ThinkingDeltaEventData.from_dict(obj)
+    content_index, text = obj.get("content_index"), obj.get("text")
+    if type(content_index) is not int or type(text) is not str:
+        return ThinkingDeltaEventData.from_dict(obj)
+    return ThinkingDelta(content_index, text)
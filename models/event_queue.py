@@ -0,0 +1,92 @@
+import os
+import queue
+import threading
+
+from dotenv import load_dotenv
+
+from models import metrics
+
+load_dotenv('env.dev')
+
+# Parsed events buffered between the network reader and the render loop (0 reads on the render thread)
+EVENT_QUEUE_SIZE = int(os.getenv("CORTEX_AGENT_DEMO_EVENT_QUEUE_SIZE", "10000"))
+# How often a reader blocked on a full queue checks whether the run was cancelled
+PUT_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class QueuedEventStream:
+    """Reads an event stream on a background thread into a bounded queue the caller drains.
+
+    Wraps a ResumableEventStream or SharedRunSubscriber and is used the same way, so a slow
+    consumer (Streamlit rendering) no longer holds back reading the socket. Errors raised by
+    the stream are re-raised to the consumer after the events before them. The
+    `event_queue.depth` gauge and `event_queue.backlog` observations show how far the
+    consumer is behind; `event_queue.full` counts reads that had to wait for it.
+    """
+
+    def __init__(self, stream, maxsize=EVENT_QUEUE_SIZE):
+        self.stream = stream
+        self._queue = queue.Queue(maxsize)
+        self._stopped = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._read, name="cortex-event-reader", daemon=True)
+        self._thread.start()
+
+    @property
+    def headers(self):
+        return self.stream.headers
+
+    @property
+    def finished(self):
+        return self.stream.finished
+
+    def _put(self, item):
+        if self._queue.full():
+            metrics.increment("event_queue.full")
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=PUT_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self):
+        try:
+            for event in self.stream:
+                if not self._put(event):
+                    return
+                metrics.set_gauge("event_queue.depth", self._queue.qsize())
+        except Exception as e:
+            self._error = e
+        self._put(_DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            backlog = self._queue.qsize()
+            metrics.set_gauge("event_queue.depth", backlog)
+            metrics.observe("event_queue.backlog", backlog)
+            if item is _DONE:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+    def cancel(self, reason="cancelled"):
+        self._stopped.set()
+        self.stream.cancel(reason)
+
+    def close(self):
+        self._stopped.set()
+        self.stream.close()
+
+    def __enter__(self):
+        self.stream.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stopped.set()
+        return self.stream.__exit__(exc_type, exc, tb)
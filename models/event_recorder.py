@@ -0,0 +1,149 @@
+import datetime
+import gzip
+import os
+import time
+
+from dotenv import load_dotenv
+
+from models import json_codec, metrics
+
+load_dotenv('env.dev')
+
+# Record every run's raw events to response_log_*.jsonl files
+RECORD_EVENTS = os.getenv("CORTEX_AGENT_DEMO_RECORD_EVENTS", "true").lower() == "true"
+RECORD_GZIP = os.getenv("CORTEX_AGENT_DEMO_RECORD_GZIP", "false").lower() == "true"
+# Start a new file once one reaches this size, and flush + fsync at most this often
+RECORD_MAX_BYTES = int(os.getenv("CORTEX_AGENT_DEMO_RECORD_MAX_BYTES", str(64 * 1024 * 1024)))
+RECORD_FSYNC_SECONDS = float(os.getenv("CORTEX_AGENT_DEMO_RECORD_FSYNC_SECONDS", "1.0"))
+RECORD_BUFFER_BYTES = 256 * 1024
+
+FORMAT_VERSION = 2
+# Raw JSON data is appended after the other fields of a record, unescaped
+RAW_FIELD = b',"json":'
+
+
+class EventRecorder:
+    """Appends a run's raw events to JSONL files as they arrive.
+
+    The first line of each file is a header record (`{"type": "header", ...}` with the
+    metadata passed in); every other line is `{"t": seconds since the run started, "event",
+    "id", "json"}`, `json` being the event's data bytes written as received (no decoding or
+    re-encoding) once it has been checked to parse; data that is not valid single-line JSON,
+    or events made in code, are stored as a string under `"data"` instead. Writes go through
+    a buffer that is flushed and fsynced every `fsync_seconds`, so a crash loses at most that
+    much.
+    Files are rotated to `<base>.1.jsonl`, `<base>.2.jsonl`, ... past `max_bytes`, and
+    gzipped when `compress` is set. A failure to write is reported once and recording
+    stops; it never interrupts the run.
+    """
+
+    def __init__(self, base, metadata=None, compress=RECORD_GZIP, max_bytes=RECORD_MAX_BYTES,
+                 fsync_seconds=RECORD_FSYNC_SECONDS, enabled=RECORD_EVENTS):
+        self.base = base
+        self.metadata = metadata or {}
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.fsync_seconds = fsync_seconds
+        self.enabled = enabled
+        self.paths = []
+        self.events = 0
+        self._file = None
+        self._raw = None
+        self._written = 0
+        self._started = time.monotonic()
+        self._synced_at = self._started
+
+    def _path(self, part):
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        return f"{self.base}{f'.{part}' if part else ''}{suffix}"
+
+    def _open(self):
+        path = self._path(len(self.paths))
+        self._raw = open(path, "wb", buffering=RECORD_BUFFER_BYTES)
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6) if self.compress else self._raw
+        self._written = 0
+        self.paths.append(path)
+        self._write({
+            "type": "header",
+            "version": FORMAT_VERSION,
+            "part": len(self.paths) - 1,
+            "timestamp": datetime.datetime.now().isoformat(),
+            **self.metadata,
+        })
+
+    def _write(self, record, raw=None):
+        if raw is None:
+            line = json_codec.dumpb(record) + b"\n"
+        else:
+            line = b"".join((json_codec.dumpb(record)[:-1], RAW_FIELD, raw, b"}\n"))
+        self._file.write(line)
+        self._written += len(line)
+
+    def _sync(self):
+        self._file.flush()
+        if self._file is not self._raw:
+            self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._synced_at = time.monotonic()
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        if self._file is not self._raw:
+            self._file.close()  # Writes the gzip trailer; leaves the raw file open
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        self._file = self._raw = None
+
+    @staticmethod
+    def _embeddable(event, payload):
+        """Whether the data bytes can go into the line unescaped: one line of valid JSON"""
+        if not isinstance(payload, bytes) or payload[:1] not in (b"{", b"[") or b"\n" in payload:
+            return False
+        try:
+            # Parsed once and cached on the event; rendering and the delta decoders read the same parse
+            event.json()
+        except ValueError:
+            return False
+        return True
+
+    def record(self, event):
+        if not self.enabled:
+            return
+        try:
+            if self._file is None:
+                self._open()
+            elif self._written >= self.max_bytes:
+                self._close_file()
+                self._open()
+            now = time.monotonic()
+            record = {"t": round(now - self._started, 6), "event": event.event, "id": event.id}
+            payload = event.payload
+            if self._embeddable(event, payload):
+                self._write(record, raw=payload)
+            else:
+                record["data"] = event.data
+                self._write(record)
+            self.events += 1
+            if now - self._synced_at >= self.fsync_seconds:
+                self._sync()
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Failed to record events to {self.base}: {e}")
+            metrics.increment("recorder.failures")
+            self.enabled = False
+
+    def close(self):
+        try:
+            self._close_file()
+        except OSError as e:
+            print(f"Failed to close event recording {self.base}: {e}")
+        if self.paths:
+            parts = f" and {len(self.paths) - 1} rotated part(s)" if len(self.paths) > 1 else ""
+            print(f"Response logged to: {self.paths[0]}{parts} ({self.events} events)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
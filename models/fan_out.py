@@ -0,0 +1,118 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from models import metrics
+from models.admission import MAX_CONCURRENCY
+from models.event_queue import EVENT_QUEUE_SIZE, PUT_POLL_SECONDS
+
+load_dotenv('env.dev')
+
+# Comma-separated agents every prompt is sent to at once, shown side by side (empty: only AGENT)
+FANOUT_AGENTS = [agent.strip() for agent in os.getenv("CORTEX_AGENT_DEMO_FANOUT_AGENTS", "").split(",") if agent.strip()]
+# Every fan-out stream holds an admission slot until all of them have been opened, so more
+# agents than slots could never all be admitted
+if len(FANOUT_AGENTS) > MAX_CONCURRENCY:
+    raise ValueError(
+        f"{len(FANOUT_AGENTS)} fan-out agents need more than CORTEX_AGENT_DEMO_MAX_CONCURRENCY={MAX_CONCURRENCY} slots"
+    )
+
+_DONE = object()
+
+
+def open_concurrently(openers):
+    """Call every `name -> open_stream()` at once; returns name -> stream, or the exception it raised.
+
+    The openers should bound their admission wait (`admission_timeout`): the streams opened
+    first keep their slots until all are open, so a run held up behind other sessions' runs
+    comes back as AdmissionTimeout instead of blocking the others.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(len(openers), 1), thread_name_prefix="cortex-fan-out") as pool:
+        futures = {name: pool.submit(open_stream) for name, open_stream in openers.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+    return results
+
+
+class MultiplexedEventStream:
+    """Reads several event streams at once into one bounded queue, yielding `(name, event)`.
+
+    Each stream is read on its own background thread, so the runs progress in parallel and
+    the slowest one sets the wall-clock time. When a stream ends, `(name, None)` is yielded;
+    if it failed, the exception is kept in `errors[name]` and the other streams go on.
+    Cancelling or leaving the `with` block cancels every stream.
+    """
+
+    def __init__(self, streams, maxsize=EVENT_QUEUE_SIZE):
+        self.streams = streams
+        self.errors = {}
+        self._queue = queue.Queue(maxsize)
+        self._stopped = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._read, args=(name, stream), name=f"cortex-fan-out-{name}", daemon=True)
+            for name, stream in streams.items()
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def finished(self):
+        return all(stream.finished for stream in self.streams.values())
+
+    def _put(self, item):
+        if self._queue.full():
+            metrics.increment("event_queue.full")
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=PUT_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self, name, stream):
+        try:
+            for event in stream:
+                if not self._put((name, event)):
+                    return
+        except Exception as e:
+            self.errors[name] = e
+        self._put((name, _DONE))
+
+    def __iter__(self):
+        remaining = len(self.streams)
+        while remaining:
+            name, item = self._queue.get()
+            metrics.set_gauge("event_queue.depth", self._queue.qsize())
+            if item is _DONE:
+                remaining -= 1
+                yield name, None
+                continue
+            yield name, item
+
+    def cancel(self, reason="cancelled"):
+        self._stopped.set()
+        for stream in self.streams.values():
+            stream.cancel(reason)
+
+    def close(self):
+        self._stopped.set()
+        for stream in self.streams.values():
+            stream.close()
+
+    def __enter__(self):
+        for stream in self.streams.values():
+            stream.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stopped.set()
+        for stream in self.streams.values():
+            stream.__exit__(exc_type, exc, tb)
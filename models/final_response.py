@@ -0,0 +1,63 @@
+from typing import Any, Dict, NamedTuple
+
+from models import (
+    ChartContentItem,
+    Message,
+    MessageContentItem,
+    SuggestedQueriesContentItem,
+    TableContentItem,
+    TextContentItem,
+    ToolResultContentItem,
+    ToolUseContentItem,
+)
+
+# Content item model by `type`, so items are validated straight from the decoded dict instead
+# of going through MessageContentItem.from_dict (a dump and two loads per item)
+CONTENT_ITEM_MODELS = {
+    "chart": ChartContentItem,
+    "suggested_queries": SuggestedQueriesContentItem,
+    "table": TableContentItem,
+    "text": TextContentItem,
+    "tool_result": ToolResultContentItem,
+    "tool_use": ToolUseContentItem,
+}
+
+
+class FinalResponse(NamedTuple):
+    """What the app keeps of the final `response` event"""
+    # Message shown in the chat history (thinking removed)
+    message: Message
+    # The same message as stored: role and non-thinking content items as received
+    message_json: Dict[str, Any]
+    # Text content concatenated, stored as the message summary
+    summary: str
+    # The complete response as received
+    response_json: Dict[str, Any]
+
+
+def _content_item(item):
+    model = CONTENT_ITEM_MODELS.get(item.get("type"))
+    if model is None:
+        return MessageContentItem.from_dict(item)
+    return MessageContentItem(model.from_dict(item))
+
+
+def process_final_response(response) -> FinalResponse:
+    """Split the decoded data of a `response` event into display message, stored JSON and summary in one pass"""
+    content = []
+    items = []
+    summary = []
+    for item in response.get("content") or ():
+        content_type = item.get("type")
+        if content_type == "thinking":
+            continue
+        content.append(item)
+        items.append(_content_item(item))
+        if content_type == "text" and isinstance(item.get("text"), str):
+            summary.append(item["text"])
+    return FinalResponse(
+        message=Message(role=response.get("role"), content=items),
+        message_json={"role": response.get("role"), "content": content},
+        summary="".join(summary),
+        response_json=response,
+    )
@@ -0,0 +1,118 @@
+import os
+
+from dotenv import load_dotenv
+
+from models import Message, MessageContentItem, TextContentItem, json_codec, metrics
+
+load_dotenv('env.dev')
+
+# History sent with a stateless run, in estimated tokens (0 sends the full history)
+HISTORY_TOKENS = int(os.getenv("CORTEX_AGENT_DEMO_HISTORY_TOKENS", "32000"))
+# Latest turns (a user message and the replies to it) always sent verbatim
+HISTORY_KEEP_TURNS = int(os.getenv("CORTEX_AGENT_DEMO_HISTORY_KEEP_TURNS", "2"))
+# Rough size of a token in serialized JSON
+BYTES_PER_TOKEN = 4
+
+
+class HistoryPlan:
+    """The messages to send for a stateless run and what was trimmed to fit the budget"""
+
+    def __init__(self, messages, budget_bytes, total_messages):
+        self.messages = messages
+        self.budget_bytes = budget_bytes
+        self.total_messages = total_messages
+        self.sent_bytes = 0
+        self.stubbed_items = 0
+        self.dropped_messages = 0
+
+    @property
+    def trimmed(self):
+        return bool(self.stubbed_items or self.dropped_messages)
+
+    def __str__(self):
+        return (
+            f"History: sending {len(self.messages)}/{self.total_messages} messages "
+            f"(~{self.sent_bytes // BYTES_PER_TOKEN} of {self.budget_bytes // BYTES_PER_TOKEN} tokens), "
+            f"{self.stubbed_items} table/chart item(s) stubbed, {self.dropped_messages} message(s) dropped"
+        )
+
+
+def _size(message: Message) -> int:
+    return len(json_codec.dumpb(message.to_dict()))
+
+
+def _stub(item: MessageContentItem) -> MessageContentItem:
+    """Replace a table or chart from an older turn with a one-line note"""
+    content = item.actual_instance
+    if content.type == "table":
+        rows = len(content.table.result_set.data or []) if content.table.result_set else 0
+        note = f"[Table '{content.table.title or content.table.query_id}' with {rows} rows omitted from history]"
+    else:
+        note = "[Chart omitted from history]"
+    return MessageContentItem(TextContentItem(type="text", text=note))
+
+
+def _stub_message(message: Message):
+    """Return the message with its tables and charts stubbed, and how many were"""
+    stubbed = 0
+    content = []
+    for item in message.content or []:
+        if item.actual_instance.type in ("table", "chart"):
+            item = _stub(item)
+            stubbed += 1
+        content.append(item)
+    if not stubbed:
+        return message, 0
+    return message.model_copy(update={"content": content}), stubbed
+
+
+def _turns(messages):
+    """Split a history into turns, each starting at a user message"""
+    turns = []
+    for message in messages:
+        if message.role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def plan_history(messages, budget_tokens=HISTORY_TOKENS, keep_turns=HISTORY_KEEP_TURNS) -> HistoryPlan:
+    """Choose the history to send so a stateless run's body stays within `budget_tokens`.
+
+    The latest `keep_turns` turns are kept as they are. Older turns have their table and chart
+    items replaced by short text notes and are added newest first while they fit; the first
+    turn that does not fit is dropped along with everything before it. Older messages are
+    only serialized until the budget runs out, so the cost per run stays bounded.
+    """
+    budget_bytes = budget_tokens * BYTES_PER_TOKEN
+    if budget_tokens <= 0:
+        return HistoryPlan(list(messages), budget_bytes, len(messages))
+
+    turns = _turns(messages)
+    kept = turns[-keep_turns:] if keep_turns > 0 else turns[-1:]
+    older = turns[:len(turns) - len(kept)]
+    plan = HistoryPlan([], budget_bytes, len(messages))
+    planned = [message for turn in kept for message in turn]
+    plan.sent_bytes = sum(_size(message) for message in planned)
+
+    for index in range(len(older) - 1, -1, -1):
+        turn, stubbed, size = [], 0, 0
+        for message in older[index]:
+            message, count = _stub_message(message)
+            turn.append(message)
+            stubbed += count
+            size += _size(message)
+        if plan.sent_bytes + size > budget_bytes:
+            plan.dropped_messages = sum(len(turn) for turn in older[:index + 1])
+            break
+        planned[:0] = turn
+        plan.sent_bytes += size
+        plan.stubbed_items += stubbed
+
+    plan.messages = planned
+    metrics.observe("history.sent_bytes", plan.sent_bytes)
+    if plan.stubbed_items:
+        metrics.increment("history.stubbed_items", plan.stubbed_items)
+    if plan.dropped_messages:
+        metrics.increment("history.dropped_messages", plan.dropped_messages)
+    return plan
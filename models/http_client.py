@@ -0,0 +1,198 @@
+import email.utils
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from models import metrics
+from models.admission import admission
+from models.deadlines import CONNECT_TIMEOUT, IDLE_TIMEOUT, ConnectDeadlineExceeded, exceeded
+
+load_dotenv('env.dev')
+
+# Number of distinct hosts to keep pools for, and keep-alive connections per host
+POOL_CONNECTIONS = int(os.getenv("CORTEX_AGENT_DEMO_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("CORTEX_AGENT_DEMO_POOL_MAXSIZE", "16"))
+# How many times a 429 is retried (after its Retry-After) before it is surfaced
+THROTTLE_RETRIES = int(os.getenv("CORTEX_AGENT_DEMO_THROTTLE_RETRIES", "3"))
+# Fallback wait when a 429 carries no usable Retry-After
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class CortexRequestError(Exception):
+    """A Cortex REST call returned an error status"""
+
+    def __init__(self, status_code, text, retry_after=None):
+        super().__init__(f"Failed request with status {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+        self.retry_after = retry_after
+
+
+class CortexThrottledError(CortexRequestError):
+    """The server kept answering 429 after all retries"""
+
+
+def _timed_connect(connection, connect):
+    """Run a connection's handshake, keeping when it finished and how long it took"""
+    metrics.increment("http.handshakes")
+    started = time.monotonic()
+    connect()
+    connection.connected_at = time.monotonic()
+    connection.connect_seconds = connection.connected_at - started
+    metrics.observe("http.connect_seconds", connection.connect_seconds)
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    connected_at = None
+    connect_seconds = None
+
+    def connect(self):
+        _timed_connect(self, super().connect)
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    connected_at = None
+    connect_seconds = None
+
+    def connect(self):
+        # TCP + TLS handshake; pooled keep-alive connections skip this entirely
+        _timed_connect(self, super().connect)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps connections alive and counts requests vs. handshakes"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        metrics.increment("http.requests")
+        return super().send(request, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session used for every Cortex REST call"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = PooledAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def connection_stats():
+    """Return request, handshake and handshake-avoided counts for the shared session"""
+    requests_sent = metrics.get("http.requests")
+    handshakes = metrics.get("http.handshakes")
+    return {
+        "requests": requests_sent,
+        "handshakes": handshakes,
+        "handshakes_avoided": max(requests_sent - handshakes, 0),
+    }
+
+
+def parse_retry_after(value):
+    """Return the Retry-After header as seconds (delta or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _connect_seconds(response, sent_at):
+    """TCP (+ TLS) connect time of the request sent at `sent_at`: 0.0 on a reused keep-alive
+    connection, None once the connection has gone back to the pool (non-streaming responses)"""
+    connection = getattr(response.raw, "_connection", None)
+    if not hasattr(connection, "connect_seconds"):
+        return None
+    if connection.connected_at is None or connection.connected_at < sent_at:
+        return 0.0
+    return round(connection.connect_seconds, 6)
+
+
+def _release_on_close(response, slot):
+    """Keep a streaming response's admission slot until the response is closed"""
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            slot.release()
+
+    response.close = close_and_release
+
+
+def cortex_request(method, url, user="default_user", admission_timeout=None, **kwargs) -> requests.Response:
+    """Send a Cortex REST call through admission control on the shared session.
+
+    Admission waits at most `admission_timeout` seconds (then AdmissionTimeout), or without
+    limit when it is None. 429s are retried after their Retry-After (which also pauses
+    everyone else's admissions). For `stream=True` the admission slot is held until the response is closed. Unless a
+    `timeout` is given, connecting is bounded by the connect deadline and every socket read
+    by the idle deadline.
+    """
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, IDLE_TIMEOUT))
+    for attempt in range(THROTTLE_RETRIES + 1):
+        slot = admission.acquire(user, timeout=admission_timeout)
+        sent_at = time.monotonic()
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except requests.exceptions.ConnectTimeout as e:
+            slot.release()
+            timeout = kwargs["timeout"]
+            raise exceeded(ConnectDeadlineExceeded, timeout[0] if isinstance(timeout, tuple) else timeout) from e
+        except BaseException:
+            slot.release()
+            raise
+        if response.status_code == 429:
+            metrics.increment("http.throttled")
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            admission.defer(DEFAULT_RETRY_AFTER if retry_after is None else retry_after)
+            if attempt < THROTTLE_RETRIES:
+                response.close()
+                slot.release()
+                continue
+        # When this attempt was sent, after admission and any 429 back-off: response deadlines count from here
+        response.sent_at = sent_at
+        response.connect_seconds = _connect_seconds(response, sent_at)
+        if kwargs.get("stream") and response.status_code < 400:
+            _release_on_close(response, slot)
+        else:
+            slot.release()
+        return response
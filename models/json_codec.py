@@ -0,0 +1,79 @@
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv('env.dev')
+
+# orjson or msgspec when installed, else the standard library. "auto" takes the first that
+# imports; "orjson", "msgspec" or "stdlib" picks one. Every backend decodes to the same
+# objects; the fast ones just write compact JSON.
+JSON_BACKEND = os.getenv("CORTEX_AGENT_DEMO_JSON_BACKEND", "auto").lower()
+
+
+def _stdlib():
+    def dumpb(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    return "stdlib", json.loads, dumpb
+
+
+def _orjson():
+    import orjson
+
+    def loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects a few inputs the stdlib accepts (e.g. integers beyond 64 bits)
+            return json.loads(data)
+
+    def dumpb(obj) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            return json.dumps(obj).encode()
+
+    return "orjson", loads, dumpb
+
+
+def _msgspec():
+    import msgspec
+
+    def loads(data):
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError:
+            return json.loads(data)
+
+    def dumpb(obj) -> bytes:
+        try:
+            return msgspec.json.encode(obj)
+        except (TypeError, OverflowError):
+            return json.dumps(obj).encode()
+
+    return "msgspec", loads, dumpb
+
+
+_BACKENDS = {"orjson": _orjson, "msgspec": _msgspec, "stdlib": _stdlib}
+
+
+def select_backend(name):
+    """Return (name, loads, dumpb) for a backend name or "auto", falling back to the stdlib"""
+    candidates = ["orjson", "msgspec", "stdlib"] if name == "auto" else [name, "stdlib"]
+    for candidate in candidates:
+        if candidate not in _BACKENDS:
+            raise ValueError(f"Unknown JSON backend: {candidate}")
+        try:
+            return _BACKENDS[candidate]()
+        except ImportError:
+            if name != "auto":
+                print(f"JSON backend {candidate} is not installed, using the standard library")
+
+
+BACKEND, loads, dumpb = select_backend(JSON_BACKEND)
+
+
+def dumps(obj) -> str:
+    """Encode to a JSON string, as `json.dumps`"""
+    return dumpb(obj).decode()
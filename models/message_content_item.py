@@ -14,7 +14,7 @@
 
 
 from __future__ import annotations
-import json
+from models import json_codec
 import pprint
 from pydantic import BaseModel, ConfigDict, Field, StrictStr, ValidationError, field_validator
 from typing import Any, List, Optional
@@ -122,7 +122,7 @@ class MessageContentItem(BaseModel):
 
     @classmethod
     def from_dict(cls, obj: Union[str, Dict[str, Any]]) -> Self:
-        return cls.from_json(json.dumps(obj))
+        return cls.from_json(json_codec.dumps(obj))
 
     @classmethod
     def from_json(cls, json_str: str) -> Self:
@@ -132,7 +132,7 @@ class MessageContentItem(BaseModel):
         match = 0
 
         # use oneOf discriminator to lookup the data type
-        _data_type = json.loads(json_str).get("type")
+        _data_type = json_codec.loads(json_str).get("type")
         if not _data_type:
             raise ValueError("Failed to lookup data type from the field `type` in the input.")
 
@@ -266,7 +266,7 @@ class MessageContentItem(BaseModel):
         if hasattr(self.actual_instance, "to_json") and callable(self.actual_instance.to_json):
             return self.actual_instance.to_json()
         else:
-            return json.dumps(self.actual_instance)
+            return json_codec.dumps(self.actual_instance)
 
     def to_dict(self) -> Optional[Union[Dict[str, Any], ChartContentItem, SuggestedQueriesContentItem, TableContentItem, TextContentItem, ThinkingContentItem, ToolResultContentItem, ToolUseContentItem]]:
         """Returns the dict representation of the actual instance"""
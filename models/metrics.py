@@ -0,0 +1,46 @@
+import threading
+from collections import defaultdict
+
+# Process-wide counters shared by the Cortex helpers (connection reuse, cancels, ...)
+_lock = threading.Lock()
+_counters = defaultdict(int)
+# Gauges hold the latest value; observations keep count/total/max of a measured quantity
+_gauges = {}
+_observations = {}
+
+
+def increment(name, value=1):
+    """Increment a named counter"""
+    with _lock:
+        _counters[name] += value
+
+
+def get(name):
+    """Return the current value of a named counter"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def set_gauge(name, value):
+    """Record the current value of a gauge (e.g. a queue depth)"""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, value):
+    """Record one measurement (e.g. a wait time in seconds)"""
+    with _lock:
+        count, total, peak = _observations.get(name, (0, 0.0, value))
+        _observations[name] = (count + 1, total + value, max(peak, value))
+
+
+def snapshot():
+    """Return a copy of all counters, gauges and observation summaries"""
+    with _lock:
+        result = dict(_counters)
+        result.update(_gauges)
+        for name, (count, total, peak) in _observations.items():
+            result[f"{name}.count"] = count
+            result[f"{name}.avg"] = total / count
+            result[f"{name}.max"] = peak
+        return result
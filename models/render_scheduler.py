@@ -0,0 +1,52 @@
+import os
+import time
+
+from dotenv import load_dotenv
+
+from models import metrics
+
+load_dotenv('env.dev')
+
+# Most screen updates per second while deltas stream in (0 renders every delta)
+RENDER_FPS = float(os.getenv("CORTEX_AGENT_DEMO_RENDER_FPS", "10"))
+
+# Events that add a new element below the streamed text, so the text is brought up to date first
+STRUCTURAL_EVENTS = frozenset({
+    "response",
+    "response.chart",
+    "response.table",
+    "response.thinking",
+    "response.tool_result",
+    "response.tool_use",
+    "error",
+})
+
+
+class RenderScheduler:
+    """Coalesces delta renders across content indexes into frames.
+
+    `update(text)` marks a StreamingText as changed and renders every changed one once a
+    frame interval has passed since the last frame. `flush()` renders immediately; call it
+    before structural events and when the stream ends. Text that arrives just before a
+    pause in the stream waits for the next event (at most one frame's worth).
+    """
+
+    def __init__(self, fps=RENDER_FPS):
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self._dirty = {}
+        self._last_frame = 0.0
+
+    def update(self, text):
+        self._dirty[id(text)] = text
+        metrics.increment("render.deltas")
+        if time.monotonic() - self._last_frame >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if not self._dirty:
+            return
+        for text in self._dirty.values():
+            text.render()
+        self._dirty.clear()
+        self._last_frame = time.monotonic()
+        metrics.increment("render.frames")
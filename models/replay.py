@@ -0,0 +1,125 @@
+import gzip
+import os
+import re
+import time
+
+from dotenv import load_dotenv
+
+from models import json_codec, metrics
+from models.event_recorder import RAW_FIELD
+from models.sse_parser import Event
+
+load_dotenv('env.dev')
+
+# A response log (response_log_*.txt or *.jsonl[.gz]) to replay instead of calling the agent
+REPLAY_PATH = os.getenv("CORTEX_AGENT_DEMO_REPLAY")
+# 1 keeps the recorded timing, 10 plays ten times faster, 0 as fast as possible
+REPLAY_SPEED = float(os.getenv("CORTEX_AGENT_DEMO_REPLAY_SPEED", "1"))
+
+TERMINAL_EVENTS = {"response", "error"}
+LEGACY_SEPARATOR = "\n" + "=" * 50 + "\n"
+ROTATED_PART = re.compile(r"^(?P<base>.*?)(?:\.(?P<part>\d+))?(?P<ext>\.jsonl(?:\.gz)?)$")
+
+
+def _read_legacy(path):
+    """Events of a response_log_*.txt written before recordings had timing (all at t=0)"""
+    with open(path) as f:
+        text = f.read()
+    _, _, stream = text.partition("=== RAW EVENT STREAM ===\n")
+    records = []
+    for block in stream.split(LEGACY_SEPARATOR):
+        if not block.startswith("EVENT: "):
+            continue
+        header, _, data = block.partition("\nDATA: ")
+        records.append((0.0, Event(header[len("EVENT: "):], data)))
+    return records
+
+
+def _parts(path):
+    """The recording file and the parts it was rotated into, in order"""
+    match = ROTATED_PART.match(path)
+    if match is None or match.group("part"):
+        return [path]
+    parts = [path]
+    while os.path.exists(f"{match.group('base')}.{len(parts)}{match.group('ext')}"):
+        parts.append(f"{match.group('base')}.{len(parts)}{match.group('ext')}")
+    return parts
+
+
+def _read_record(line):
+    """(t, Event) of one recorded line, or None for a header; raw JSON data is sliced out as-is"""
+    cut = line.find(RAW_FIELD)
+    if cut < 0:
+        record = json_codec.loads(line)
+        if record.get("type") == "header":
+            return None
+        return record["t"], Event(record["event"], record["data"], record.get("id"))
+    record = json_codec.loads(line[:cut] + b"}")
+    return record["t"], Event(record["event"], id=record.get("id"), raw=line[cut + len(RAW_FIELD):].rstrip(b"\r\n")[:-1])
+
+
+def read_recording(path):
+    """Load a recorded run as a list of (seconds since start, Event)"""
+    if not path.endswith((".jsonl", ".jsonl.gz")):
+        return _read_legacy(path)
+    records = []
+    for part in _parts(path):
+        with (gzip.open(part, "rb") if part.endswith(".gz") else open(part, "rb")) as f:
+            for line in f:
+                record = _read_record(line)
+                if record is not None:
+                    records.append(record)
+    return records
+
+
+class ReplayStream:
+    """Plays a recorded run back as an event stream, usable wherever a ResumableEventStream is.
+
+    `speed` scales the recorded gaps between events: 1 is the original timing, 10 is ten
+    times faster, 0 yields as fast as the consumer reads. The same recording always yields
+    the same events in the same order.
+    """
+
+    def __init__(self, path, speed=REPLAY_SPEED):
+        self.path = path
+        self.speed = speed
+        self.records = read_recording(path)
+        self.finished = False
+        self.cancelled = False
+        self.cancel_reason = None
+
+    @property
+    def headers(self):
+        return {"X-Snowflake-Request-Id": f"replay:{os.path.basename(self.path)}"}
+
+    def __iter__(self):
+        started = time.monotonic()
+        for offset, event in self.records:
+            if self.speed > 0:
+                delay = started + offset / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            if self.cancelled:
+                return
+            if event.event in TERMINAL_EVENTS:
+                self.finished = True
+            metrics.increment("replay.events")
+            yield event
+        self.finished = True
+        elapsed = time.monotonic() - started
+        metrics.observe("replay.seconds", elapsed)
+        print(f"Replayed {len(self.records)} events from {self.path} in {elapsed:.3f}s (speed {self.speed:g})")
+
+    def cancel(self, reason="cancelled"):
+        if not self.cancelled and not self.finished:
+            self.cancelled = True
+            self.cancel_reason = reason
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cancel("abandoned" if exc_type is None else exc_type.__name__)
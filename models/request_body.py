@@ -0,0 +1,83 @@
+import os
+import zlib
+from typing import Iterable, Iterator
+
+from dotenv import load_dotenv
+
+from models import DataAgentRunRequest, json_codec, metrics
+
+load_dotenv('env.dev')
+
+# "gzip" compresses :run bodies (Content-Encoding: gzip); "none" sends them as plain JSON
+REQUEST_COMPRESSION = os.getenv("CORTEX_AGENT_DEMO_REQUEST_COMPRESSION", "none").lower()
+GZIP_LEVEL = int(os.getenv("CORTEX_AGENT_DEMO_GZIP_LEVEL", "6"))
+# Serialized messages are coalesced into writes of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json(request: DataAgentRunRequest, chunk_size=CHUNK_SIZE) -> Iterator[bytes]:
+    """Serialize a run request one message at a time.
+
+    The joined chunks decode to the same object as `request.to_json()`, but the full body is
+    never held as one string; only the message being encoded is.
+    """
+    head = request.model_copy(update={"messages": None}).to_dict()
+    # Fields other than messages are small; open the messages array after them
+    prefix = json_codec.dumpb(head)[:-1]
+    buffer = bytearray(prefix + (b', "messages": [' if head else b'"messages": ['))
+    for index, message in enumerate(request.messages or []):
+        if index:
+            buffer += b", "
+        buffer += json_codec.dumpb(message.to_dict())
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]}"
+    yield bytes(buffer)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level=GZIP_LEVEL) -> Iterator[bytes]:
+    """Compress a stream of chunks into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class RequestBody:
+    """Streamed body for a :run request.
+
+    Pass it as `data=` to requests: it is sent with chunked transfer encoding, and since every
+    iteration serializes the request afresh, 429 retries and stream reconnects can re-send it.
+    Add `headers` to the request headers so the server knows about any compression.
+    """
+
+    def __init__(self, request: DataAgentRunRequest, compression=REQUEST_COMPRESSION):
+        if compression not in ("gzip", "none"):
+            raise ValueError(f"Unsupported request compression: {compression}")
+        self.request = request
+        self.compression = compression
+
+    @property
+    def headers(self):
+        return {"Content-Encoding": "gzip"} if self.compression == "gzip" else {}
+
+    def __iter__(self) -> Iterator[bytes]:
+        chunks = iter_json(self.request)
+        if self.compression == "gzip":
+            chunks = gzip_chunks(chunks)
+        sent = 0
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+        metrics.observe("request.body_bytes", sent)
+
+    async def aiter(self):
+        """The same chunks as an async iterator, for aiohttp"""
+        for chunk in self:
+            yield chunk
+
+    def to_bytes(self) -> bytes:
+        return b"".join(self)
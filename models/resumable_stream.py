@@ -0,0 +1,226 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+import requests
+import urllib3
+from dotenv import load_dotenv
+
+from models import metrics
+from models.deadlines import (
+    FIRST_EVENT_TIMEOUT,
+    IDLE_TIMEOUT,
+    FirstEventDeadlineExceeded,
+    IdleDeadlineExceeded,
+    RunDeadlineExceeded,
+    exceeded,
+)
+from models.sse_parser import CHUNK_SIZE, Event, iter_events
+
+load_dotenv('env.dev')
+
+MAX_RECONNECTS = int(os.getenv("CORTEX_AGENT_DEMO_STREAM_RECONNECTS", "3"))
+BACKOFF_SECONDS = float(os.getenv("CORTEX_AGENT_DEMO_STREAM_BACKOFF", "0.5"))
+MAX_BACKOFF_SECONDS = 8.0
+
+# Synthetic event yielded when the server could not resume and the run started over
+RESTART_EVENT = "stream.restart"
+# Once one of these has arrived the run is complete and a dropped connection is harmless
+TERMINAL_EVENTS = {"response", "error"}
+# Raised by requests while iterating a body whose connection went away
+DROP_ERRORS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ConnectionError,
+)
+
+
+def shutdown_response(response):
+    """Close a streaming response, unblocking a read in progress on another thread"""
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+class ResumableEventStream:
+    """Iterates the SSE events of an agent run, reconnecting with backoff if the connection drops.
+
+    `connect(last_event_id)` must post the *same* run request each time it is called.
+    When the previous stream carried event ids, the reconnect sends `Last-Event-ID` and
+    already-seen ids are skipped. Otherwise the run restarts from the original
+    `parent_message_id` and a `stream.restart` event tells the consumer to expect the
+    content again.
+
+    `cancel()` closes the socket and stops iteration without reconnecting; using the stream
+    as a context manager cancels it if the consumer leaves before the run finished.
+
+    Each connection attempt must deliver its first event within `first_event_timeout`
+    (counted from when the request was sent, after admission) or FirstEventDeadlineExceeded
+    is raised. The gap between
+    events is bounded by the socket read timeout `connect` uses; a stall past it raises
+    IdleDeadlineExceeded. Neither is retried: the server is up but not producing.
+    """
+
+    def __init__(self, connect, max_reconnects=MAX_RECONNECTS, backoff=BACKOFF_SECONDS,
+                 first_event_timeout=FIRST_EVENT_TIMEOUT, idle_timeout=IDLE_TIMEOUT):
+        self._connect = connect
+        self.max_reconnects = max_reconnects
+        self.backoff = backoff
+        self.first_event_timeout = first_event_timeout
+        self.idle_timeout = idle_timeout
+        self.last_event_id = None
+        self.reconnects = 0
+        self.bytes_received = 0
+        self.first_byte_at = None
+        self.finished = False
+        self.cancelled = False
+        self.cancel_reason = None
+        self._first_event_missed = False
+        self._attempt_started = None
+        self.response = self._open(None)
+
+    def _open(self, last_event_id):
+        response = self._connect(last_event_id)
+        # The deadline counts from when the request was sent (cortex_request's `sent_at`), so
+        # waiting for admission or a 429 back-off does not use it up
+        self._attempt_started = getattr(response, "sent_at", None) or time.monotonic()
+        return response
+
+    @property
+    def headers(self):
+        return self.response.headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.finished:
+            self.cancel("abandoned" if exc_type is None else exc_type.__name__)
+        self.close()
+
+    def close(self):
+        shutdown_response(self.response)
+
+    def cancel(self, reason="cancelled"):
+        """Stop the run: close the connection so the server stops streaming and the slot is freed"""
+        if self.cancelled or self.finished:
+            return
+        self.cancelled = True
+        self.cancel_reason = reason
+        metrics.increment("runs.cancelled")
+        metrics.increment(f"runs.cancelled.{reason}")
+        print(f"Cancelled agent run ({reason}) after {self.reconnects} reconnects")
+        self.close()
+
+    def _reconnect(self, failures):
+        delay = min(MAX_BACKOFF_SECONDS, self.backoff * 2 ** (failures - 1))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+        self.response.close()
+        self.reconnects += 1
+        metrics.increment("stream.reconnects")
+        self.response = self._open(self.last_event_id)
+
+    def _events(self):
+        """Parse the current response, counting the bytes received and stamping when each event arrived"""
+        for name, data, event_id in iter_events(self._chunks()):
+            yield Event(name, id=event_id, raw=data, received_at=time.monotonic())
+
+    def _chunks(self):
+        for chunk in self.response.iter_content(CHUNK_SIZE):
+            if self.first_byte_at is None:
+                self.first_byte_at = time.monotonic()
+            self.bytes_received += len(chunk)
+            yield chunk
+
+    def _watch_first_event(self):
+        """Start a timer that cuts the connection if the first event is late"""
+        remaining = self.first_event_timeout - (time.monotonic() - self._attempt_started)
+        response = self.response
+
+        def expire():
+            self._first_event_missed = True
+            shutdown_response(response)
+
+        watchdog = threading.Timer(max(remaining, 0.0), expire)
+        watchdog.daemon = True
+        watchdog.start()
+        return watchdog
+
+    def __iter__(self):
+        seen_ids = set()
+        failures = 0
+        check_resume = False
+        while not self.cancelled:
+            watchdog = None
+            try:
+                if failures:
+                    self._reconnect(failures)
+                    check_resume = True
+                watchdog = self._watch_first_event()
+                for event in self._events():
+                    watchdog.cancel()
+                    if self.cancelled:
+                        return
+                    if check_resume:
+                        check_resume = False
+                        if not (self.last_event_id and event.id):
+                            # Server ignored Last-Event-ID (or never sent ids): the run started over
+                            metrics.increment("stream.restarts")
+                            seen_ids.clear()
+                            yield Event(event=RESTART_EVENT)
+                        else:
+                            metrics.increment("stream.resumes")
+                    if event.id:
+                        if event.id in seen_ids:
+                            continue
+                        seen_ids.add(event.id)
+                        self.last_event_id = event.id
+                    failures = 0
+                    if event.event in TERMINAL_EVENTS:
+                        self.finished = True
+                    yield event
+                if self.finished or self.cancelled:
+                    return
+                if self._first_event_missed:
+                    # The watchdog closed the socket; a read it unblocked may end cleanly instead of raising
+                    raise exceeded(FirstEventDeadlineExceeded, self.first_event_timeout)
+                print("Event stream ended before the run finished, reconnecting")
+            except DROP_ERRORS as e:
+                if self.finished or self.cancelled:
+                    return
+                if self._first_event_missed:
+                    raise exceeded(FirstEventDeadlineExceeded, self.first_event_timeout) from e
+                if e.args and isinstance(e.args[0], urllib3.exceptions.ReadTimeoutError):
+                    raise exceeded(IdleDeadlineExceeded, self.idle_timeout) from e
+                print(f"Event stream dropped: {e}")
+            except RunDeadlineExceeded:
+                raise
+            except Exception as e:
+                if self.cancelled:
+                    return
+                # Reconnect attempt rejected by the server
+                if not failures:
+                    raise
+                print(f"Reconnect failed: {e}")
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+
+            failures += 1
+            if failures > self.max_reconnects:
+                metrics.increment("stream.interrupted")
+                self.finished = True
+                yield Event(
+                    event="error",
+                    data=json.dumps({
+                        "code": "stream_interrupted",
+                        "message": f"Connection lost and {self.max_reconnects} reconnect attempts failed",
+                    }),
+                )
+                return
@@ -0,0 +1,24 @@
+from models import DataAgentRunRequest
+from models.history_planner import plan_history
+
+
+def build_run_request(messages, thread_id=None, parent_message_id=None) -> DataAgentRunRequest:
+    """Build the :run request body for a conversation turn.
+
+    With a thread the server keeps the context, so only the latest message is sent along with
+    the thread and parent message ids. Without one the history is sent, trimmed to the token
+    budget by `plan_history`.
+    """
+    if thread_id:
+        return DataAgentRunRequest(
+            thread_id=thread_id,
+            parent_message_id=parent_message_id,
+            messages=[messages[-1]],  # Only the latest message
+        )
+    plan = plan_history(messages)
+    if plan.trimmed:
+        print(plan)
+    return DataAgentRunRequest(
+        model="claude-4-sonnet",
+        messages=plan.messages,
+    )
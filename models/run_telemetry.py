@@ -0,0 +1,180 @@
+import bisect
+import datetime
+import os
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+from models import json_codec, metrics
+
+load_dotenv('env.dev')
+
+# Append one JSON line of timings per run to this file (empty disables it)
+TELEMETRY_PATH = os.getenv("CORTEX_AGENT_DEMO_TELEMETRY_PATH", "run_telemetry.jsonl")
+
+# Upper bounds (ms) of the inter-delta gap histogram buckets; larger gaps go to "overflow"
+GAP_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+DELTA_EVENTS = frozenset({"response.text.delta", "response.thinking.delta", "response.tool_result.analyst.delta"})
+
+
+def _gap_histogram():
+    return dict.fromkeys([f"<={bound}ms" for bound in GAP_BUCKETS_MS] + ["overflow"], 0)
+
+
+def _stream_attr(stream, name, default=None):
+    """`name` from the outermost stream that has it, through QueuedEventStream / SharedRunSubscriber wrappers"""
+    while stream is not None:
+        if hasattr(stream, name):
+            return getattr(stream, name)
+        stream = getattr(stream, "stream", None)
+    return default
+
+
+class RunTelemetry:
+    """Where the seconds of one agent run go.
+
+    Create it just before the request is sent, call `connected()` once the response headers
+    are in, `observe(event)` for every event, `tool_use()` / `tool_result()` at the tool
+    events and `finish(stream)` at the end (or use it as a context manager around the
+    stream). Times are seconds since the request was started; event times are when the
+    event came off the socket (`Event.received_at`, stamped on the reader thread), not when
+    the renderer got to it, so a slow UI does not show up as gaps in the stream.
+    `record()` returns the run as a dict: TCP/TLS connect time (`connect_s`, 0 on a reused
+    keep-alive connection), time to response headers, first byte, first `response.status`,
+    first text delta and total times, a histogram of the gaps between deltas,
+    per-`tool_use_id` durations from `response.tool_use` to `response.tool_result`, event
+    counts and bytes. `headers_s` is everything before the response started: waiting for
+    admission, 429 back-off and retries, connecting, sending the body and the server's time
+    to headers (`admission.wait_seconds` in the metrics has the admission part alone).
+    """
+
+    def __init__(self, agent=None, path=TELEMETRY_PATH):
+        self.agent = agent
+        self.path = path
+        self.request_id = None
+        self.status = "running"
+        self.connect_s = None
+        self.headers_s = None
+        self.first_byte_s = None
+        self.first_status_s = None
+        self.first_text_s = None
+        self.total_s = None
+        self.bytes_received = None
+        self.data_bytes = 0
+        self.reconnects = 0
+        self.event_counts = Counter()
+        self.gaps = _gap_histogram()
+        self.max_gap_s = 0.0
+        self.tools = {}
+        self._tool_started = {}
+        self._last_delta = None
+        self._stream = None
+        self._started = time.monotonic()
+        self._finished = False
+
+    def _elapsed(self, now=None):
+        return round((now or time.monotonic()) - self._started, 6)
+
+    def _event_time(self, at=None):
+        """When an event arrived; events buffered before this run joined a shared run count as arriving at its start"""
+        return time.monotonic() if at is None else max(at, self._started)
+
+    def connected(self, stream=None):
+        self.headers_s = self._elapsed()
+        if stream is not None:
+            self._stream = stream
+            self.request_id = stream.headers.get("X-Snowflake-Request-Id")
+            self.connect_s = getattr(_stream_attr(stream, "response"), "connect_seconds", None)
+
+    def observe(self, event):
+        now = self._event_time(event.received_at)
+        self.event_counts[event.event] += 1
+        self.data_bytes += len(event.payload)
+        match event.event:
+            case "response.status":
+                if self.first_status_s is None:
+                    self.first_status_s = self._elapsed(now)
+            case "stream.restart":
+                self._last_delta = None
+        if event.event in DELTA_EVENTS:
+            if event.event == "response.text.delta" and self.first_text_s is None:
+                self.first_text_s = self._elapsed(now)
+            if self._last_delta is not None:
+                gap = now - self._last_delta
+                self.max_gap_s = max(self.max_gap_s, gap)
+                index = bisect.bisect_left(GAP_BUCKETS_MS, gap * 1000)
+                self.gaps[f"<={GAP_BUCKETS_MS[index]}ms" if index < len(GAP_BUCKETS_MS) else "overflow"] += 1
+            self._last_delta = now
+
+    def tool_use(self, tool_use_id, name=None, at=None):
+        """Start timing a tool at its `response.tool_use` event (`at`: the event's `received_at`)"""
+        self._tool_started.setdefault(tool_use_id, (name, self._event_time(at)))
+
+    def tool_result(self, tool_use_id, status=None, at=None):
+        """Stop timing a tool at its `response.tool_result` event (`at`: the event's `received_at`)"""
+        name, started = self._tool_started.pop(tool_use_id, (None, None))
+        if started is not None:
+            self.tools[tool_use_id] = {
+                "name": name,
+                "status": status,
+                "seconds": round(self._event_time(at) - started, 6),
+            }
+
+    def finish(self, stream=None, status=None):
+        if self._finished:
+            return
+        self._finished = True
+        self.status = status or ("error" if self.event_counts["error"] else "completed")
+        self.total_s = self._elapsed()
+        stream = stream or self._stream
+        # A SharedRunSubscriber reports its own first byte: a follower never sees one before it joined
+        first_byte_at = _stream_attr(stream, "first_byte_at")
+        if first_byte_at is not None:
+            self.first_byte_s = self._elapsed(first_byte_at)
+        self.bytes_received = _stream_attr(stream, "bytes_received")
+        self.reconnects = _stream_attr(stream, "reconnects", 0)
+        for tool_use_id, (name, _) in self._tool_started.items():
+            # The run ended before this tool returned a result
+            self.tools[tool_use_id] = {"name": name, "status": None, "seconds": None}
+        metrics.observe("run.total_seconds", self.total_s)
+        if self.first_text_s is not None:
+            metrics.observe("run.first_text_seconds", self.first_text_s)
+        self._write()
+
+    def record(self):
+        return {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "agent": self.agent,
+            "request_id": self.request_id,
+            "status": self.status,
+            "connect_s": self.connect_s,
+            "headers_s": self.headers_s,
+            "first_byte_s": self.first_byte_s,
+            "first_status_s": self.first_status_s,
+            "first_text_s": self.first_text_s,
+            "total_s": self.total_s,
+            "max_gap_s": round(self.max_gap_s, 6),
+            "gap_histogram": dict(self.gaps),
+            "tools": dict(self.tools),
+            "events": sum(self.event_counts.values()),
+            "event_counts": dict(self.event_counts),
+            "data_bytes": self.data_bytes,
+            "bytes_received": self.bytes_received,
+            "reconnects": self.reconnects,
+        }
+
+    def _write(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "ab") as f:
+                f.write(json_codec.dumpb(self.record()) + b"\n")
+        except OSError as e:
+            print(f"Failed to write run telemetry to {self.path}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(status=None if exc_type is None else exc_type.__name__)
@@ -0,0 +1,171 @@
+import hashlib
+import threading
+import time
+
+from models import metrics
+from models.request_body import iter_json
+
+# Identical runs currently in flight, by request key
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+def request_key(url, request, tee=None) -> str:
+    """Hash of a run request: same agent URL and same body give the same key.
+
+    `tee(chunk)` is called with every serialized chunk, so the body can be logged from the
+    same serialization pass.
+    """
+    digest = hashlib.sha256(f"{url}\n".encode())
+    # Serialization is deterministic, so hashing the streamed body avoids building it in full
+    for chunk in iter_json(request):
+        digest.update(chunk)
+        if tee is not None:
+            tee(chunk)
+    return digest.hexdigest()
+
+
+class SharedRun:
+    """One upstream event stream whose events are buffered and replayed to every subscriber"""
+
+    def __init__(self, key):
+        self.key = key
+        self.stream = None
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self._cond = threading.Condition()
+
+    def start(self, open_stream):
+        """Connect (on the caller's thread) and pump events on a background thread"""
+        try:
+            self.stream = open_stream()
+        except BaseException as e:
+            self._finish(e)
+            raise
+        with self._cond:
+            self._cond.notify_all()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self):
+        error = None
+        try:
+            with self.stream:
+                for event in self.stream:
+                    with self._cond:
+                        self.events.append(event)
+                        self._cond.notify_all()
+        except Exception as e:
+            error = e
+        self._finish(error)
+
+    def _finish(self, error):
+        with _runs_lock:
+            if _runs.get(self.key) is self:
+                del _runs[self.key]
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def wait_connected(self):
+        with self._cond:
+            while self.stream is None and not self.done:
+                self._cond.wait()
+            if self.stream is None:
+                raise self.error
+
+    def event_at(self, index):
+        """Block until event `index` exists; None once the stream ended before it"""
+        with self._cond:
+            while index >= len(self.events) and not self.done:
+                self._cond.wait()
+            if index < len(self.events):
+                return self.events[index]
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def detach(self, reason):
+        """A subscriber left; cancel upstream once nobody is listening"""
+        with _runs_lock:
+            with self._cond:
+                self.subscribers -= 1
+                last = self.subscribers == 0 and not self.done
+            # Stop new callers joining a run that is about to be cancelled
+            if last and _runs.get(self.key) is self:
+                del _runs[self.key]
+        if last:
+            self.stream.cancel(reason)
+
+
+class SharedRunSubscriber:
+    """One caller's view of a SharedRun, usable wherever a ResumableEventStream is"""
+
+    def __init__(self, run):
+        self._run = run
+        self.finished = False
+        self.cancelled = False
+        self._attached_at = time.monotonic()
+
+    @property
+    def stream(self):
+        return self._run.stream
+
+    @property
+    def headers(self):
+        return self._run.stream.headers
+
+    @property
+    def first_byte_at(self):
+        """When the shared run's first byte arrived, or when this subscriber joined if that was later"""
+        first_byte_at = getattr(self._run.stream, "first_byte_at", None)
+        return None if first_byte_at is None else max(first_byte_at, self._attached_at)
+
+    def __iter__(self):
+        index = 0
+        while not self.cancelled:
+            event = self._run.event_at(index)
+            if event is None:
+                break
+            index += 1
+            yield event
+        self._close("finished")
+
+    def _close(self, reason):
+        if not self.finished:
+            self.finished = True
+            self._run.detach(reason)
+
+    def cancel(self, reason="cancelled"):
+        if not self.finished:
+            self.cancelled = True
+            self._close(reason)
+
+    def close(self):
+        self.cancel("closed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cancel("abandoned" if exc_type is None else exc_type.__name__)
+
+
+def subscribe(key, open_stream) -> SharedRunSubscriber:
+    """Join the in-flight run with this key, or start it with `open_stream()` if there is none"""
+    with _runs_lock:
+        run = _runs.get(key)
+        leader = run is None
+        if leader:
+            run = _runs[key] = SharedRun(key)
+        with run._cond:
+            run.subscribers += 1
+    if leader:
+        metrics.increment("single_flight.upstream_runs")
+        run.start(open_stream)
+    else:
+        metrics.increment("single_flight.deduplicated")
+        run.wait_connected()
+    return SharedRunSubscriber(run)
@@ -0,0 +1,142 @@
+import os
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from models import json_codec
+
+load_dotenv('env.dev')
+
+# Upper bound on the bytes read from the socket per chunk while streaming events
+CHUNK_SIZE = int(os.getenv("CORTEX_AGENT_DEMO_SSE_CHUNK_SIZE", "16384"))
+
+_UNDECODED = object()
+
+
+class Event:
+    """One server-sent event; a drop-in for `sseclient.Event`.
+
+    Events read off the wire keep their data as the raw bytes received (`raw`) and only
+    decode it when asked: `data` is the str, `json()` the parsed object and `decode(model)`
+    a pydantic model, each built on first use. Events made in code can pass `data` instead.
+    `received_at` is the `time.monotonic()` the event was parsed off the socket, if known.
+    """
+
+    __slots__ = ("event", "id", "received_at", "_raw", "_data", "_json")
+
+    def __init__(self, event="message", data=None, id=None, raw=None, received_at=None):
+        self.event = event
+        self.id = id
+        self.received_at = received_at
+        self._raw = raw
+        self._data = "" if data is None and raw is None else data
+        self._json = _UNDECODED
+
+    @property
+    def raw(self) -> bytes:
+        """The data as bytes, as received"""
+        if self._raw is None:
+            self._raw = self._data.encode("utf-8")
+        return self._raw
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            self._data = self._raw.decode("utf-8")
+        return self._data
+
+    @property
+    def payload(self):
+        """The data in whatever form the event already holds it (bytes or str), for parsers that take either"""
+        return self._raw if self._raw is not None else self._data
+
+    def json(self):
+        """The data parsed as JSON (parsed once, then cached)"""
+        if self._json is _UNDECODED:
+            self._json = json_codec.loads(self.payload)
+        return self._json
+
+    def decode(self, model):
+        """The data as an instance of a generated model class, e.g. `event.decode(StatusEventData)`"""
+        return model.from_dict(self.json())
+
+    def __repr__(self):
+        return f"Event(event={self.event!r}, id={self.id!r}, {len(self.payload)} bytes)"
+
+
+class SSEParser:
+    """Incremental server-sent events parser over raw byte chunks.
+
+    `feed()` takes chunks as they come off the socket, split anywhere, and returns the
+    `(event, data, id)` tuples they completed, with `data` as bytes. Only whole lines are
+    split, in one pass per chunk; a single-line `data:` field is passed on without a join.
+    Lines end in `\\n` or `\\r\\n`. Like sseclient, events without data are not dispatched
+    and an event's id is not carried over to the events after it; unlike it, an event cut
+    off by the end of the stream is discarded rather than dispatched half-received.
+    """
+
+    def __init__(self):
+        # Chunks of a line not yet ended; joined once its newline arrives, so a long line is not copied per chunk
+        self._pending = []
+        self._event = None
+        self._data = []
+        self._id = None
+
+    def feed(self, chunk: bytes) -> List[Tuple[str, bytes, Optional[str]]]:
+        cut = chunk.rfind(b"\n")
+        if cut < 0:
+            self._pending.append(chunk)
+            return []
+        if self._pending:
+            self._pending.append(chunk[:cut])
+            block = b"".join(self._pending)
+        else:
+            block = chunk[:cut]
+        tail = chunk[cut + 1:]
+        self._pending = [tail] if tail else []
+
+        events = []
+        data = self._data
+        for line in block.split(b"\n"):
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not line:
+                # Blank line dispatches the event
+                if data:
+                    events.append((
+                        self._event or "message",
+                        data[0] if len(data) == 1 else b"\n".join(data),
+                        self._id,
+                    ))
+                    data = self._data = []
+                self._event = self._id = None
+                continue
+            if line.startswith(b"data:"):
+                data.append(line[6:] if line.startswith(b"data: ") else line[5:])
+                continue
+            field, _, value = line.partition(b":")
+            if not field:
+                continue  # Comment
+            if value.startswith(b" "):
+                value = value[1:]
+            if field == b"event":
+                self._event = value.decode()
+            elif field == b"id":
+                self._id = value.decode()
+            elif field == b"data":
+                data.append(value)
+        return events
+
+
+def iter_events(chunks: Iterable[bytes]) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+    """Parse an iterable of byte chunks into `(event, data, id)` tuples"""
+    parser = SSEParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def response_events(response, chunk_size=CHUNK_SIZE) -> Iterator[Event]:
+    """Events from a streaming `requests` response, holding the raw data bytes"""
+    for event, data, event_id in iter_events(response.iter_content(chunk_size)):
+        yield Event(event, id=event_id, raw=data, received_at=time.monotonic())
@@ -1,16 +1,26 @@
 import os
-import requests
+import threading
+
 import streamlit as st
 from dotenv import load_dotenv
 
+from models.admission import ADMISSION_TIMEOUT, AdmissionTimeout, session_user
+from models.http_client import cortex_request
+from models.thread_prefetcher import ThreadPrefetcher
+
 load_dotenv('env.dev')
 
 PAT = os.getenv("CORTEX_AGENT_DEMO_PAT")
 HOST = os.getenv("CORTEX_AGENT_DEMO_HOST")
+# "http" lets the app talk to mock_cortex_server.py
+SCHEME = os.getenv("CORTEX_AGENT_DEMO_SCHEME", "https")
+# Number of threads created ahead of time, and how long (seconds) an unused one stays valid
+THREAD_POOL_SIZE = int(os.getenv("CORTEX_AGENT_DEMO_THREAD_POOL_SIZE", "2"))
+THREAD_POOL_TTL = float(os.getenv("CORTEX_AGENT_DEMO_THREAD_POOL_TTL", "1800"))
 
-def create_new_thread():
-    """Create a new thread and return thread ID"""
-    url = f"https://{HOST}/api/v2/cortex/threads"
+def _post_new_thread(user="default_user"):
+    """POST a new thread and return the raw response"""
+    url = f"{SCHEME}://{HOST}/api/v2/cortex/threads"
     
     headers = {
         'Authorization': f'Bearer {PAT}',
@@ -21,18 +31,11 @@ def create_new_thread():
         "origin_application": "cortex_agent"
     }
     
-    response = requests.post(url, headers=headers, json=payload)
-    
-    if response.status_code < 400:
-        response_data = response.json()
-        return response_data
-    else:
-        st.error(f"Failed to create thread: {response.status_code} - {response.text}")
-        return None
+    return cortex_request("POST", url, user=user, admission_timeout=ADMISSION_TIMEOUT, headers=headers, json=payload)
 
-def update_thread_name(thread_id, thread_name):
-    """Update thread name"""
-    url = f"https://{HOST}/api/v2/cortex/threads/{thread_id}"
+def _post_thread_name(thread_id, thread_name, user="default_user"):
+    """POST a thread name update and return the raw response"""
+    url = f"{SCHEME}://{HOST}/api/v2/cortex/threads/{thread_id}"
     
     headers = {
         'Authorization': f'Bearer {PAT}',
@@ -43,7 +46,30 @@ def update_thread_name(thread_id, thread_name):
         "thread_name": thread_name
     }
     
-    response = requests.post(url, headers=headers, json=payload)
+    return cortex_request("POST", url, user=user, admission_timeout=ADMISSION_TIMEOUT, headers=headers, json=payload)
+
+def create_new_thread():
+    """Create a new thread and return thread ID"""
+    try:
+        response = _post_new_thread(session_user())
+    except AdmissionTimeout as e:
+        st.error(f"Failed to create thread: {e}")
+        return None
+    
+    if response.status_code < 400:
+        response_data = response.json()
+        return response_data
+    else:
+        st.error(f"Failed to create thread: {response.status_code} - {response.text}")
+        return None
+
+def update_thread_name(thread_id, thread_name):
+    """Update thread name"""
+    try:
+        response = _post_thread_name(thread_id, thread_name, session_user())
+    except AdmissionTimeout as e:
+        st.error(f"Failed to update thread name: {e}")
+        return False
     
     if response.status_code < 400:
         return True
@@ -51,17 +77,57 @@ def update_thread_name(thread_id, thread_name):
         st.error(f"Failed to update thread name: {response.status_code} - {response.text}")
         return False
 
+def _prefetch_thread():
+    """Create a thread for the background pool (no Streamlit calls - runs off the script thread)"""
+    try:
+        response = _post_new_thread()
+    except Exception as e:
+        print(f"Failed to pre-create thread: {e}")
+        return None
+    if response.status_code < 400:
+        return response.json()
+    print(f"Failed to pre-create thread: {response.status_code} - {response.text}")
+    return None
+
+def _delete_thread(thread_data):
+    """Best-effort delete of a pre-created thread that expired unused"""
+    url = f"{SCHEME}://{HOST}/api/v2/cortex/threads/{thread_data.get('thread_id')}"
+    try:
+        cortex_request("DELETE", url, admission_timeout=ADMISSION_TIMEOUT, headers={'Authorization': f'Bearer {PAT}'})
+    except Exception as e:
+        print(f"Failed to delete expired thread: {e}")
+
+# Process-wide pool of ready-to-use threads shared by every session
+thread_pool = ThreadPrefetcher(_prefetch_thread, THREAD_POOL_SIZE, THREAD_POOL_TTL, discard=_delete_thread)
+
+def _rename_thread_in_background(thread_id, thread_name, user):
+    try:
+        response = _post_thread_name(thread_id, thread_name, user)
+        if response.status_code >= 400:
+            print(f"Failed to update thread name: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"Failed to update thread name: {e}")
+
+def apply_pending_thread_name():
+    """Send a thread name chosen at 'Start New Thread' time; called on the thread's first run"""
+    pending = st.session_state.get('pending_thread_name')
+    # Only rename the thread the name was chosen for, even if another one was loaded since
+    if pending and pending[0] == st.session_state.get('current_thread_id'):
+        st.session_state.pending_thread_name = None
+        threading.Thread(target=_rename_thread_in_background, args=(*pending, session_user()), daemon=True).start()
+
 def clear_chat_session(custom_name=None):
     """Clear the chat messages and create new thread with optional custom name"""
     st.session_state.messages = []
-    thread_data = create_new_thread()
+    # Take a pre-created thread when one is ready; fall back to creating it inline
+    thread_data = thread_pool.acquire() or create_new_thread()
     if thread_data:
         thread_id = thread_data.get('thread_id')
         
-        # Set custom name if provided
+        # Set custom name if provided; the server is told on the first run, not now
+        st.session_state.pending_thread_name = (thread_id, custom_name) if custom_name else None
         if custom_name:
-            if update_thread_name(thread_id, custom_name):
-                thread_data['thread_name'] = custom_name
+            thread_data['thread_name'] = custom_name
         
         # Initialize thread conversation tracking
         st.session_state.current_thread_data = thread_data
@@ -0,0 +1,88 @@
+import collections
+import threading
+import time
+
+from models import metrics
+
+# Wait this long before trying again after the server refused to create a thread
+RETRY_SECONDS = 30.0
+
+
+class ThreadPrefetcher:
+    """Keeps a few server-side threads created ahead of time so starting one costs no round trip.
+
+    `create()` returns new thread data (or None on failure) and runs on a background thread,
+    so it must not touch Streamlit. Threads older than `ttl` seconds are handed to
+    `discard(thread_data)` instead of being used.
+    """
+
+    def __init__(self, create, size, ttl, discard=None):
+        self._create = create
+        self._discard = discard
+        self.size = size
+        self.ttl = ttl
+        self._ready = collections.deque()  # (created_at, thread_data), oldest first
+        self._lock = threading.Lock()
+        self._filling = False
+        self._retry_at = 0.0
+
+    def _pop_expired(self):
+        """Remove expired entries; caller holds the lock"""
+        now = time.monotonic()
+        expired = []
+        while self._ready and now - self._ready[0][0] > self.ttl:
+            expired.append(self._ready.popleft()[1])
+        return expired
+
+    def _discard_all(self, expired):
+        for thread_data in expired:
+            metrics.increment("thread_pool.expired")
+            if self._discard:
+                self._discard(thread_data)
+
+    def acquire(self):
+        """Return a pre-created thread, or None if the pool is empty, and schedule a top-up"""
+        with self._lock:
+            expired = self._pop_expired()
+            thread_data = self._ready.popleft()[1] if self._ready else None
+        metrics.increment("thread_pool.hits" if thread_data else "thread_pool.misses")
+        self.refill()
+        if expired:
+            threading.Thread(target=self._discard_all, args=(expired,), daemon=True).start()
+        return thread_data
+
+    def refill(self):
+        """Top the pool up in the background; cheap when it is already full"""
+        with self._lock:
+            if self.size <= 0 or self._filling or time.monotonic() < self._retry_at:
+                return
+            # Full and the oldest entry still fresh: nothing to do
+            if len(self._ready) >= self.size and time.monotonic() - self._ready[0][0] <= self.ttl:
+                return
+            self._filling = True
+        threading.Thread(target=self._fill, daemon=True).start()
+
+    def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    expired = self._pop_expired()
+                    missing = self.size - len(self._ready)
+                self._discard_all(expired)
+                if missing <= 0:
+                    return
+                thread_data = self._create()
+                if not thread_data:
+                    with self._lock:
+                        self._retry_at = time.monotonic() + RETRY_SECONDS
+                    return
+                metrics.increment("thread_pool.created")
+                with self._lock:
+                    self._ready.append((time.monotonic(), thread_data))
+        finally:
+            with self._lock:
+                self._filling = False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ready)